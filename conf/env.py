@@ -104,6 +104,14 @@ class BaseSettings(PydanticBaseSettings):
 
     sso_suspicious_login_max_attempts: int = 10
     sso_suspicious_activity_notification_email: str = ""
+    sso_suspicious_login_notification_window_seconds: int = 60 * 60
+    sso_session_user_cache_seconds: int = 60
+    sso_session_user_batch_max_size: int = 100
+    sso_page_view_batch_max_size: int = 100
+    password_hashing_max_concurrency: int = 2
+    password_hashing_slot_timeout_seconds: int = 30
+    password_hashing_pbkdf2_iterations: Optional[int] = None
+    feature_deferred_password_rehash_enabled: bool = False
 
     health_check_token: str
 
@@ -125,6 +133,9 @@ class BaseSettings(PydanticBaseSettings):
     activity_stream_ip_whitelist: str = ""
     activity_stream_access_key_id: str
     activity_stream_secret_access_key: str
+    activity_stream_page_cache_seconds: int = 60 * 60
+    activity_stream_max_page_size: int = 1000
+    activity_stream_adaptive_page_target_ms: int = 500
 
     feature_skip_migrate: bool = False
     feature_disable_registration: bool = False
@@ -151,6 +162,7 @@ class BaseSettings(PydanticBaseSettings):
     directory_constants_url_great_magna: str = "https://great.gov.uk/"
 
     data_retention_storage_years: int = 3
+    outbox_retention_days: int = 30
 
     feature_use_bgs_templates: bool = False
 
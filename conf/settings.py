@@ -1,10 +1,11 @@
 import os
 import ssl
-from typing import Any, Dict
 from pathlib import Path
+from typing import Any, Dict
 
 import dj_database_url
 import sentry_sdk
+from celery.schedules import crontab
 from django.urls import reverse_lazy
 from django_log_formatter_asim import ASIMFormatter
 from sentry_sdk.integrations.celery import CeleryIntegration
@@ -73,7 +74,7 @@ INSTALLED_APPS = [
 SITE_ID = 1
 
 MIDDLEWARE = [
-    'django.middleware.cache.UpdateCacheMiddleware',
+    'core.middleware.UpdateCacheMiddleware',
     'directory_components.middleware.MaintenanceModeMiddleware',
     'core.middleware.SSODisplayLoggedInCookieMiddleware',
     'django.middleware.security.SecurityMiddleware',
@@ -85,8 +86,9 @@ MIDDLEWARE = [
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
-    'directory_components.middleware.NoCacheMiddlware',
-    'django.middleware.cache.FetchFromCacheMiddleware',
+    'core.middleware.PasswordHashingUnavailableMiddleware',
+    'core.middleware.NoCacheMiddleware',
+    'core.middleware.FetchFromCacheMiddleware',
 ]
 
 ROOT_URLCONF = 'conf.urls'
@@ -257,6 +259,24 @@ AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'directory_validators.password.PasswordWordPasswordValidator'},
 ]
 
+# At most this many password hashes are computed at once by the web workers of a node, which share the limit through
+# Redis. Further logins and password checks are answered with a 503. Slots of a worker that dies are freed after the
+# timeout.
+PASSWORD_HASHING_MAX_CONCURRENCY = env.password_hashing_max_concurrency
+PASSWORD_HASHING_SLOT_TIMEOUT_SECONDS = env.password_hashing_slot_timeout_seconds
+# Unset uses Django's default. See the calibrate_password_hashers management command.
+PASSWORD_HASHING_PBKDF2_ITERATIONS = env.password_hashing_pbkdf2_iterations
+# Upgrade outdated hashes found at login in the background rather than inline.
+FEATURE_DEFERRED_PASSWORD_REHASH_ENABLED = env.feature_deferred_password_rehash_enabled
+
+PASSWORD_HASHERS = [
+    'sso.user.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+
 AUTHENTICATION_BACKENDS = [
     'oauth2_provider.backends.OAuth2Backend',
     'django.contrib.auth.backends.ModelBackend',
@@ -374,6 +394,11 @@ SIGAUTH_URL_NAMES_WHITELIST = [
     'pingdom',
     'activity-stream-users',
     'activity-stream-user-answers-vfm',
+    'activity-stream-user-page-views',
+    'activity-stream-lessons-completed',
+    'activity-stream-user-data',
+    'activity-stream-user-profiles',
+    'activity-stream-outbox',
     'clearcache_admin',
 ]
 
@@ -450,6 +475,8 @@ PRIVACY_COOKIE_DOMAIN = env.privacy_cookie_domain
 # twice, so we use 2*5
 SSO_SUSPICIOUS_LOGIN_MAX_ATTEMPTS = env.sso_suspicious_login_max_attempts
 SSO_SUSPICIOUS_ACTIVITY_NOTIFICATION_EMAIL = env.sso_suspicious_activity_notification_email
+# at most one suspicious activity email is sent per user in this window
+SSO_SUSPICIOUS_LOGIN_NOTIFICATION_WINDOW_SECONDS = env.sso_suspicious_login_notification_window_seconds
 
 # Health check
 DIRECTORY_HEALTHCHECK_TOKEN = env.health_check_token
@@ -480,6 +507,12 @@ ACTIVITY_STREAM_IP_WHITELIST = env.activity_stream_ip_whitelist
 ACTIVITY_STREAM_ACCESS_KEY_ID = env.activity_stream_access_key_id
 ACTIVITY_STREAM_SECRET_ACCESS_KEY = env.activity_stream_secret_access_key
 ACTIVITY_STREAM_NONCE_EXPIRY_SECONDS = 60
+# rendered feed pages are also evicted as soon as a model they are read from changes
+ACTIVITY_STREAM_PAGE_CACHE_SECONDS = env.activity_stream_page_cache_seconds
+# upper bound on the page_size a collector can ask for
+ACTIVITY_STREAM_MAX_PAGE_SIZE = env.activity_stream_max_page_size
+# render time that page_size=auto aims to keep a page under
+ACTIVITY_STREAM_ADAPTIVE_PAGE_TARGET_MS = env.activity_stream_adaptive_page_target_ms
 
 # feature flags
 FEATURE_FLAGS = {
@@ -509,6 +542,12 @@ CACHE_MIDDLEWARE_SECONDS = 60 * 30  # 30 minutes
 
 
 SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+# how long the user snapshot behind an sso session key is kept in cache
+SSO_SESSION_USER_CACHE_SECONDS = env.sso_session_user_cache_seconds
+# maximum number of session keys accepted by the batch session-user endpoint
+SSO_SESSION_USER_BATCH_MAX_SIZE = env.sso_session_user_batch_max_size
+# maximum number of page views accepted in one request to the page views endpoint
+SSO_PAGE_VIEW_BATCH_MAX_SIZE = env.sso_page_view_batch_max_size
 
 ACCOUNT_SESSION_REMEMBER = True
 
@@ -551,12 +590,21 @@ CELERY_BROKER_USE_SSL = {'ssl_cert_reqs': ssl.CERT_NONE}
 CELERY_REDIS_BACKEND_USE_SSL = CELERY_BROKER_USE_SSL
 
 CELERY_IMPORTS = ('sso.tasks',)
+# installed into the django_celery_beat schedule when beat starts
+CELERY_BEAT_SCHEDULE = {
+    'prune-outbox-events': {
+        'task': 'sso.tasks.prune_outbox_events',
+        'schedule': crontab(hour=3, minute=0),
+    },
+}
 # Flag for loading magna header
 MAGNA_HEADER = env.magna_header
 DIRECTORY_CONSTANTS_URL_GREAT_MAGNA = env.directory_constants_url_great_magna
 
 # Data retention
 DATA_RETENTION_STORAGE_YEARS = env.data_retention_storage_years
+# outbox events are kept this long, so the outbox feed must be read at least this often
+OUTBOX_RETENTION_DAYS = env.outbox_retention_days
 
 DATETIME_INPUT_FORMATS = ['%Y-%m-%d']
 
@@ -67,6 +67,7 @@ api_urlpatterns = [
     re_path(r'^healthcheck/$', directory_healthcheck.views.HealthcheckView.as_view(), name='healthcheck'),
     re_path(r'^healthcheck/ping/$', directory_healthcheck.views.PingView.as_view(), name='healthcheck-ping'),
     re_path(r'^session-user/$', sso.api.views_user.SessionUserAPIView.as_view(), name='session-user'),
+    re_path(r'^session-user/batch/$', sso.api.views_user.SessionUserBatchAPIView.as_view(), name='session-user-batch'),
     re_path(r'^last-login/$', sso.api.views_user.LastLoginAPIView.as_view(), name='last-login'),
     re_path(r'^password-check/$', sso.api.views_user.PasswordCheckAPIView.as_view(), name='password-check'),
     re_path(
@@ -84,6 +85,31 @@ api_urlpatterns = [
         sso.api.views_activity_stream.ActivityStreamDirectorySSOUserAnswersVFM.as_view(),
         name='activity-stream-user-answers-vfm',
     ),
+    re_path(
+        r'^activity-stream/user-page-views/$',
+        sso.api.views_activity_stream.ActivityStreamDirectorySSOUserPageViews.as_view(),
+        name='activity-stream-user-page-views',
+    ),
+    re_path(
+        r'^activity-stream/lessons-completed/$',
+        sso.api.views_activity_stream.ActivityStreamDirectorySSOLessonsCompleted.as_view(),
+        name='activity-stream-lessons-completed',
+    ),
+    re_path(
+        r'^activity-stream/user-data/$',
+        sso.api.views_activity_stream.ActivityStreamDirectorySSOUserData.as_view(),
+        name='activity-stream-user-data',
+    ),
+    re_path(
+        r'^activity-stream/user-profiles/$',
+        sso.api.views_activity_stream.ActivityStreamDirectorySSOUserProfiles.as_view(),
+        name='activity-stream-user-profiles',
+    ),
+    re_path(
+        r'^activity-stream/outbox/$',
+        sso.api.views_activity_stream.ActivityStreamDirectorySSOOutbox.as_view(),
+        name='activity-stream-outbox',
+    ),
     re_path(
         r'^verification-code/regenerate/$',
         sso.verification.views.RegenerateCodeCreateAPIView.as_view(),
@@ -103,6 +129,11 @@ api_urlpatterns = [
     re_path(
         r'^user/lesson-completed/$', sso.user.views_api.LessonCompletedAPIView.as_view(), name='user-lesson-completed'
     ),
+    re_path(
+        r'^user/lesson-completed/progress/$',
+        sso.user.views_api.LessonProgressAPIView.as_view(),
+        name='user-lesson-progress',
+    ),
     re_path(r'^user/questionnaire/$', sso.user.views_api.UserQuestionnaireView.as_view(), name='user-questionnaire'),
     re_path(r'^user/data/$', sso.user.views_api.UserDataView.as_view(), name='user-data'),
 ]
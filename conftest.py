@@ -1,6 +1,10 @@
 from unittest.mock import patch
 
 import pytest
+from django.core.cache import cache
+
+from core.cache_invalidation import registry
+from sso.user.catalogue import local_catalogue
 
 
 @pytest.fixture(autouse=True)
@@ -17,3 +21,12 @@ def feature_flags(settings):
     # solves this issue: https://github.com/pytest-dev/pytest-django/issues/601
     settings.FEATURE_FLAGS = {**settings.FEATURE_FLAGS}
     yield settings.FEATURE_FLAGS
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    # cache invalidation is deferred until commit, which never happens inside a test transaction
+    registry.discard_pending()
+    cache.clear()
+    local_catalogue.clear()
+    yield
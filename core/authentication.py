@@ -1,8 +1,117 @@
+import hashlib
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
 from django.contrib.sessions.models import Session
+from django.core.cache import cache, caches
+from django.db.models import prefetch_related_objects
 from django.utils import timezone
 from rest_framework import authentication, exceptions
 
-from sso.user.models import User
+from sso.user.models import User, UserProfile
+
+SESSION_USER_CACHE_KEY = 'sso:session-user:{user_id}'
+USER_ETAG_CACHE_KEY = 'sso:user-etag:{user_id}'
+
+
+def get_session_user(session_key):
+    """Resolve the user behind an sso session key.
+
+    The session is loaded through the configured SESSION_ENGINE, so the
+    cached_db backend answers from cache before falling back to the database.
+    The user is then served from a short-lived snapshot that is evicted
+    whenever the user or their profile changes (see core.signals).
+    """
+    if not session_key:
+        return None
+    session = import_module(settings.SESSION_ENGINE).SessionStore(session_key=session_key)
+    if session.session_key is None:
+        # the key failed the session backend's format validation
+        return None
+    user_id = session.load().get(SESSION_KEY)
+    if user_id is None:
+        return None
+
+    cache_key = SESSION_USER_CACHE_KEY.format(user_id=user_id)
+    user = cache.get(cache_key)
+    if user is None:
+        try:
+            user = User.objects.select_related('user_profile').get(pk=user_id)
+        except User.DoesNotExist:
+            return None
+        cache.set(cache_key, user, settings.SSO_SESSION_USER_CACHE_SECONDS)
+    return user
+
+
+def get_session_users(session_keys):
+    """Resolve many sso session keys at once, returning a map of session key to user.
+
+    Keys that are invalid, expired or not logged in are left out. Sessions and
+    user snapshots are read from cache in bulk and the misses are loaded with
+    one query each, so the number of queries does not grow with the number of
+    keys. Social accounts are prefetched after the snapshots are cached.
+    """
+    session_store = import_module(settings.SESSION_ENGINE).SessionStore
+    session_keys = {key for key in session_keys if session_store(session_key=key).session_key is not None}
+    if not session_keys:
+        return {}
+
+    # the cached_db backend keeps the decoded session under its key prefix
+    key_prefix = getattr(session_store, 'cache_key_prefix', None)
+    session_data = {}
+    if key_prefix:
+        cached_sessions = caches[settings.SESSION_CACHE_ALIAS].get_many([key_prefix + key for key in session_keys])
+        session_data = {key.removeprefix(key_prefix): data for key, data in cached_sessions.items()}
+    missing_session_keys = session_keys - session_data.keys()
+    if missing_session_keys:
+        sessions = Session.objects.filter(session_key__in=missing_session_keys, expire_date__gt=timezone.now())
+        for session in sessions:
+            session_data[session.session_key] = session_store().decode(session.session_data)
+
+    user_ids = {key: str(data[SESSION_KEY]) for key, data in session_data.items() if SESSION_KEY in data}
+    cache_keys = {user_id: SESSION_USER_CACHE_KEY.format(user_id=user_id) for user_id in set(user_ids.values())}
+    cached_users = cache.get_many(cache_keys.values())
+    users = {user_id: cached_users[cache_key] for user_id, cache_key in cache_keys.items() if cache_key in cached_users}
+    missing_user_ids = cache_keys.keys() - users.keys()
+    if missing_user_ids:
+        loaded = {
+            str(user.pk): user for user in User.objects.select_related('user_profile').filter(pk__in=missing_user_ids)
+        }
+        cache.set_many(
+            {cache_keys[user_id]: user for user_id, user in loaded.items()}, settings.SSO_SESSION_USER_CACHE_SECONDS
+        )
+        users.update(loaded)
+    prefetch_related_objects(list(users.values()), 'socialaccount_set')
+    return {key: users[user_id] for key, user_id in user_ids.items() if user_id in users}
+
+
+def get_user_etag(user):
+    """Strong ETag for the serialized user, read from cache where possible.
+
+    Derived from the user, their profile and their social accounts, whose
+    changes evict it (see core.signals).
+    """
+    cache_key = USER_ETAG_CACHE_KEY.format(user_id=user.pk)
+    etag = cache.get(cache_key)
+    if etag is None:
+        try:
+            profile_modified = user.user_profile.modified
+        except UserProfile.DoesNotExist:
+            profile_modified = None
+        # prefetched, so that a serializer running next reuses the accounts
+        prefetch_related_objects([user], 'socialaccount_set')
+        social_accounts = sorted(
+            (account.pk, account.provider, account.last_login) for account in user.socialaccount_set.all()
+        )
+        version = repr((user.pk, user.modified, profile_modified, social_accounts))
+        etag = f'"{hashlib.sha256(version.encode()).hexdigest()}"'
+        cache.set(cache_key, etag)
+    return etag
+
+
+def evict_session_user(user_id):
+    cache.delete(SESSION_USER_CACHE_KEY.format(user_id=user_id))
 
 
 class SessionAuthentication(authentication.BaseAuthentication):
@@ -35,13 +144,4 @@ class SessionAuthentication(authentication.BaseAuthentication):
         return self.keyword
 
     def get_user(self, session_key):
-        try:
-            session = Session.objects.get(session_key=session_key, expire_date__gt=timezone.now())
-        except Session.DoesNotExist:
-            return None
-        else:
-            user_id = session.get_decoded().get('_auth_user_id')
-            try:
-                return User.objects.get(pk=user_id)
-            except User.DoesNotExist:
-                return None
+        return get_session_user(session_key)
@@ -0,0 +1,132 @@
+import logging
+import threading
+import uuid
+from collections import Counter, defaultdict, namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django_redis import get_redis_connection
+
+logger = logging.getLogger(__name__)
+
+# core.middleware keys the cached pages of views built from users under this version, which a user change retires
+USER_PAGE_CACHE_VERSION_KEY = 'sso:user-page-cache-version'
+# sso.api.views_activity_stream keys cached feed pages under these (see ActivityStreamFeed)
+ACTIVITY_STREAM_FEED_VERSION_CACHE_KEY = 'sso:activity-stream-version:{activity_type}'
+ACTIVITY_STREAM_FEED_HIGH_WATER_MARK_CACHE_KEY = 'sso:activity-stream-high-water-mark:{activity_type}'
+INVALIDATION_COUNTS_KEY = 'sso:cache-invalidations'
+DELETE_CHUNK_SIZE = 1000
+
+Dependency = namedtuple('Dependency', ['keys', 'on_save', 'on_delete'])
+
+
+class PendingInvalidations(threading.local):
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.keys = set()
+        self.counts = Counter()
+        self.flush_scheduled = False
+
+
+class InvalidationRegistry:
+    """Maps models to the cache entries that are derived from them.
+
+    Saving or deleting an instance of a registered model deletes only the
+    cache keys registered against that model, rather than flushing the whole
+    cache. Saves of unregistered models do not touch the cache at all.
+    Entries derived from many rows, such as cached pages, are keyed under a
+    version (see get_version) so that deleting one key retires them all.
+
+    Invalidations made inside a transaction are collected, de-duplicated and
+    sent to Redis in a single pipeline once the transaction commits, so bulk
+    updates and deletes cost a handful of round trips instead of one per row.
+    """
+
+    def __init__(self):
+        self._dependencies = defaultdict(list)
+        self._pending = PendingInvalidations()
+
+    def register(self, model_label, keys, on_save=True, on_delete=True):
+        """Register cache entries depending on the model `model_label` (e.g. 'user.User').
+
+        `keys` is a callable that receives the changed instance and returns the
+        cache keys derived from it.
+        """
+        self._dependencies[model_label].append(Dependency(keys, on_save, on_delete))
+
+    def is_registered(self, model_label):
+        return model_label in self._dependencies
+
+    def get_stale_keys(self, instance, deleted=False):
+        keys = set()
+        for dependency in self._dependencies.get(instance._meta.label, []):
+            if (deleted and not dependency.on_delete) or (not deleted and not dependency.on_save):
+                continue
+            keys.update(dependency.keys(instance))
+        return keys
+
+    def invalidate(self, instance, deleted=False):
+        keys = self.get_stale_keys(instance, deleted=deleted)
+        if not keys:
+            return
+        self._pending.keys.update(keys)
+        self._pending.counts[instance._meta.label] += 1
+
+        connection = transaction.get_connection()
+        if not connection.in_atomic_block:
+            self.flush()
+        elif not self._pending.flush_scheduled or not self._is_flush_scheduled(connection):
+            transaction.on_commit(self.flush)
+            self._pending.flush_scheduled = True
+
+    def _is_flush_scheduled(self, connection):
+        # A rolled back savepoint discards the callbacks registered within it, so the flag alone is not enough.
+        return any(callback == self.flush for _, callback, _ in connection.run_on_commit)
+
+    def discard_pending(self):
+        self._pending.clear()
+
+    def flush(self):
+        keys, counts = self._pending.keys, self._pending.counts
+        self._pending.clear()
+        if not keys:
+            return
+        if settings.DEBUG:
+            logger.info(f'Invalidating {len(keys)} keys for {dict(counts)}.')
+
+        stale_keys = [cache.make_key(key) for key in keys]
+        pipeline = get_redis_connection('default').pipeline(transaction=False)
+        for start in range(0, len(stale_keys), DELETE_CHUNK_SIZE):
+            end = start + DELETE_CHUNK_SIZE
+            pipeline.delete(*stale_keys[start:end])
+        for label, count in counts.items():
+            pipeline.hincrby(INVALIDATION_COUNTS_KEY, label, count)
+        pipeline.execute()
+
+
+def get_version(version_key):
+    """The token that cache entries versioned by `version_key` are currently keyed under.
+
+    Registering `version_key` against a model retires all of those entries
+    with a single delete, as the next reader then stores a fresh token. The
+    token is random rather than a counter, so an evicted version never comes
+    back to entries that are still cached.
+    """
+    version = cache.get(version_key)
+    if version is None:
+        version = uuid.uuid4().hex
+        if not cache.add(version_key, version, timeout=None):
+            version = cache.get(version_key, version)
+    return version
+
+
+def get_invalidation_counts():
+    """Number of cache invalidations triggered by each model, across all workers."""
+    counts = get_redis_connection('default').hgetall(INVALIDATION_COUNTS_KEY)
+    return {label.decode(): int(count) for label, count in counts.items()}
+
+
+registry = InvalidationRegistry()
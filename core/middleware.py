@@ -1,7 +1,17 @@
+from contextvars import ContextVar
+
+from directory_components import middleware
 from django.conf import settings
 from django.http import HttpResponse
+from django.middleware import cache
 from django.utils.deprecation import MiddlewareMixin
 
+from core.cache_invalidation import get_version
+from sso.user.hashing import PasswordHashingUnavailable
+
+# the version of the view's pages read when the request looked up its page, so the response is stored under it too
+page_cache_version = ContextVar('page_cache_version', default=None)
+
 
 class SSODisplayLoggedInCookieMiddleware(MiddlewareMixin):
     def process_response(self, request, response):
@@ -37,3 +47,70 @@ class AdminPermissionCheckMiddleware(MiddlewareMixin):
             if self.is_admin_name_space(request) or request.path_info.startswith('/admin/login'):
                 if not request.user.is_staff:
                     return HttpResponse(self.SSO_UNAUTHORISED_ACCESS_MESSAGE, status=401)
+
+
+class PasswordHashingUnavailableMiddleware(MiddlewareMixin):
+    """Answers a request that found every password hashing slot taken with a 503 (see sso.user.hashing).
+
+    Login, password change and any other view that authenticates or checks a
+    password can be refused a slot, so they are all handled here.
+    """
+
+    def process_exception(self, request, exception):
+        if isinstance(exception, PasswordHashingUnavailable):
+            return HttpResponse(status=503, headers={'Retry-After': '1'})
+
+
+class PageCacheVersionMixin:
+    """Keys the cached pages of a view under the version named by its `page_cache_version_key`, if it has one.
+
+    Registering that key against the models the pages are built from retires
+    them all with one delete (see core.signals). The pages of other views are
+    kept for CACHE_MIDDLEWARE_SECONDS whatever changes.
+    """
+
+    @property
+    def key_prefix(self):
+        version = page_cache_version.get()
+        return f'{self.base_key_prefix}.{version}' if version else self.base_key_prefix
+
+    @key_prefix.setter
+    def key_prefix(self, value):
+        self.base_key_prefix = value
+
+
+class UpdateCacheMiddleware(PageCacheVersionMixin, cache.UpdateCacheMiddleware):
+    def process_response(self, request, response):
+        try:
+            return super().process_response(request, response)
+        finally:
+            # the version belongs to this request only, and must not be seen by the next one in this thread
+            token = getattr(request, '_page_cache_version_token', None)
+            if token is not None:
+                page_cache_version.reset(token)
+                del request._page_cache_version_token
+
+
+class FetchFromCacheMiddleware(PageCacheVersionMixin, cache.FetchFromCacheMiddleware):
+    """Looks the page up once the view, and so the version of its pages, is known."""
+
+    def process_request(self, request):
+        return None
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        version_key = getattr(getattr(view_func, 'view_class', view_func), 'page_cache_version_key', None)
+        if version_key is not None:
+            # read before the view runs, so a page built from data changed meanwhile is stored under the retired version
+            request._page_cache_version_token = page_cache_version.set(get_version(version_key))
+        return super().process_request(request)
+
+
+class NoCacheMiddleware(middleware.NoCacheMiddlware):
+    """Also marks authenticated responses private.
+
+    The response to an authenticated request belongs to its user, but the
+    page cache keys responses by URL only. UpdateCacheMiddleware skips private
+    responses, so they are never served to another user.
+    """
+
+    NO_CACHE_HEADER_VALUE = 'no-store, no-cache, must-revalidate, private'
@@ -1,5 +1,33 @@
+from django.utils.cache import add_never_cache_headers, get_conditional_response, patch_vary_headers
+from rest_framework.response import Response
+
+from core.authentication import get_user_etag
+
+
 class NoIndexMixin:
     def dispatch(self, *args, **kwargs):
         response = super().dispatch(*args, **kwargs)
         response['X-Robots-Tag'] = 'noindex'
         return response
+
+
+class ConditionalUserRetrieveMixin:
+    """Answer a GET for a serialized user with 304 Not Modified when the client's ETag is current.
+
+    The ETag is looked up in cache, so a 304 costs no serialization. The
+    response is per user, so it is marked never to be cached, which also keeps
+    it out of the site's page cache and lets every conditional request reach
+    the view.
+    """
+
+    def retrieve(self, request, *args, **kwargs):
+        user = self.get_object()
+        etag = get_user_etag(user)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = Response(self.get_serializer(user).data)
+        response['ETag'] = etag
+        add_never_cache_headers(response)
+        # for any cache between the client and us
+        patch_vary_headers(response, ['Authorization'])
+        return response
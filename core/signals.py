@@ -1,23 +1,86 @@
-import logging
-
-from django.conf import settings
-from django.core.cache import cache
+from django.contrib.auth.signals import user_logged_out
 from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 
-logger = logging.getLogger(__name__)
+from core.authentication import SESSION_USER_CACHE_KEY, USER_ETAG_CACHE_KEY, evict_session_user
+from core.cache_invalidation import (
+    ACTIVITY_STREAM_FEED_HIGH_WATER_MARK_CACHE_KEY,
+    ACTIVITY_STREAM_FEED_VERSION_CACHE_KEY,
+    USER_PAGE_CACHE_VERSION_KEY,
+    registry,
+)
+from sso.user.catalogue import CATALOGUE_VERSION_CACHE_KEY, QUESTIONNAIRE_VERSION_CACHE_KEY, clear_local_catalogue
+
+# Django's caching middleware caches anonymous GET responses. Authenticated and per user ones are private (see
+# core.middleware and core.mixins), which leaves the last login and test API users pages as the cached ones built from
+# models. Both read only users and are keyed under the user page version, so saving or deleting a user retires them
+# and no other page.
+# The models behind the session user snapshot and the user ETag evict those too.
+# Password changes are persisted with User.save() so are covered by the User dependency.
+registry.register(
+    'user.User',
+    keys=lambda user: [
+        SESSION_USER_CACHE_KEY.format(user_id=user.pk),
+        USER_ETAG_CACHE_KEY.format(user_id=user.pk),
+        USER_PAGE_CACHE_VERSION_KEY,
+    ],
+)
+registry.register(
+    'user.UserProfile',
+    keys=lambda profile: [
+        SESSION_USER_CACHE_KEY.format(user_id=profile.user_id),
+        USER_ETAG_CACHE_KEY.format(user_id=profile.user_id),
+    ],
+)
+registry.register(
+    'socialaccount.SocialAccount', keys=lambda account: [USER_ETAG_CACHE_KEY.format(user_id=account.user_id)]
+)
+# service and page ids by name, which every process keeps under the catalogue version
+for model_label in ('user.Service', 'user.ServicePage'):
+    registry.register(model_label, keys=lambda instance: [CATALOGUE_VERSION_CACHE_KEY])
+    post_save.connect(clear_local_catalogue, sender=model_label, weak=False)
+    post_delete.connect(clear_local_catalogue, sender=model_label, weak=False)
+# questionnaires rendered for a version of their service's questions
+registry.register(
+    'user.Question', keys=lambda question: [QUESTIONNAIRE_VERSION_CACHE_KEY.format(service_id=question.service_id)]
+)
+# The model of each activity stream feed in sso.api.views_activity_stream, whose activity type is the model's name.
+ACTIVITY_STREAM_FEED_MODELS = (
+    'user.User',
+    'user.UserAnswer',
+    'user.UserPageView',
+    'user.LessonCompleted',
+    'user.UserData',
+    'user.UserProfile',
+)
+# cached activity stream pages are keyed by their feed's version and high-water mark (see ActivityStreamFeed). Only
+# rows of the feed's own model move either, as the models joined to do not change which rows a page holds.
+for model_label in ACTIVITY_STREAM_FEED_MODELS:
+    registry.register(
+        model_label,
+        keys=lambda instance: [ACTIVITY_STREAM_FEED_VERSION_CACHE_KEY.format(activity_type=instance._meta.object_name)],
+        on_save=False,
+    )
+    registry.register(
+        model_label,
+        keys=lambda instance: [
+            ACTIVITY_STREAM_FEED_HIGH_WATER_MARK_CACHE_KEY.format(activity_type=instance._meta.object_name)
+        ],
+        on_delete=False,
+    )
 
 
 @receiver(post_save, weak=False)
+def invalidate_cache_on_save(instance, **kwargs):
+    registry.invalidate(instance)
+
+
 @receiver(post_delete, weak=False)
-def clear_the_cache(**kwargs):
-    '''
-    We have implemented Django caching middleware. By default, this caches all GET requests.
-
-    This signal will invalidate the cache when any models.Model.save() or delete() method is called.
-    '''
-    if settings.DEBUG:
-        logger.info('A models.Model.save() or delete() has been invoked - attempting cache.clear() call.')
-    cache.clear()
-    if settings.DEBUG:
-        logger.info('cache.clear() call complete.')
+def invalidate_cache_on_delete(instance, **kwargs):
+    registry.invalidate(instance, deleted=True)
+
+
+@receiver(user_logged_out)
+def evict_session_user_on_logout(user, **kwargs):
+    if user is not None:
+        evict_session_user(user.pk)
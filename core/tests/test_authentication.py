@@ -1,4 +1,6 @@
 import pytest
+from django.contrib.auth.signals import user_logged_out
+from django.core.cache import cache
 from django.test.client import Client
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
@@ -73,3 +75,90 @@ def test_sso_session_authentication_no_user(rf):
 
     assert response.status_code == 401
     assert response.render().content == b'{"detail":"Invalid session id"}'
+
+
+@pytest.mark.django_db
+def test_get_session_user_cached(valid_session, user, django_assert_num_queries):
+    assert authentication.get_session_user(valid_session._session_key) == user
+
+    with django_assert_num_queries(0):
+        assert authentication.get_session_user(valid_session._session_key) == user
+
+
+@pytest.mark.django_db
+def test_get_session_user_evicted_on_user_save(django_capture_on_commit_callbacks):
+    with django_capture_on_commit_callbacks(execute=True):
+        user = UserFactory()
+        session = Client().session
+        session['_auth_user_id'] = user.id
+        session.save()
+        authentication.get_session_user(session._session_key)
+        user.first_name = 'Jim'
+        user.save()
+
+    assert authentication.get_session_user(session._session_key).first_name == 'Jim'
+
+
+@pytest.mark.django_db
+def test_get_session_user_evicted_on_logout(valid_session, user, rf):
+    authentication.get_session_user(valid_session._session_key)
+    cache_key = authentication.SESSION_USER_CACHE_KEY.format(user_id=user.pk)
+    assert cache.get(cache_key) == user
+
+    user_logged_out.send(sender=user.__class__, request=rf.get('/'), user=user)
+
+    assert cache.get(cache_key) is None
+
+
+@pytest.mark.django_db
+def test_get_session_user_invalid_session_key():
+    assert authentication.get_session_user('short') is None
+    assert authentication.get_session_user('') is None
+
+
+def create_sessions(users):
+    sessions = []
+    for user in users:
+        session = Client().session
+        session['_auth_user_id'] = user.id
+        session.save()
+        sessions.append(session)
+    return sessions
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('count', (1, 5))
+def test_get_session_users_constant_queries(count, django_assert_num_queries):
+    users = UserFactory.create_batch(count)
+    session_keys = [session.session_key for session in create_sessions(users)]
+    cache.clear()
+
+    # sessions, users, social accounts
+    with django_assert_num_queries(3):
+        resolved = authentication.get_session_users(session_keys)
+
+    assert resolved == dict(zip(session_keys, users))
+
+
+@pytest.mark.django_db
+def test_get_session_users_cached(django_assert_num_queries):
+    users = UserFactory.create_batch(3)
+    session_keys = [session.session_key for session in create_sessions(users)]
+    authentication.get_session_users(session_keys)
+
+    # only the social accounts are queried
+    with django_assert_num_queries(1):
+        assert authentication.get_session_users(session_keys) == dict(zip(session_keys, users))
+
+
+@pytest.mark.django_db
+def test_get_session_users_skips_unresolved(valid_session, expired_session, user):
+    anonymous_session = Client().session
+    anonymous_session['foo'] = 'bar'
+    anonymous_session.save()
+
+    resolved = authentication.get_session_users(
+        [valid_session.session_key, expired_session.session_key, anonymous_session.session_key, 'short', 'not-exist']
+    )
+
+    assert resolved == {valid_session.session_key: user}
@@ -0,0 +1,126 @@
+from unittest import mock
+
+import pytest
+from django.core.cache import cache
+from django.db import transaction
+
+from core.authentication import SESSION_USER_CACHE_KEY
+from core.cache_invalidation import (
+    USER_PAGE_CACHE_VERSION_KEY,
+    InvalidationRegistry,
+    get_invalidation_counts,
+    get_version,
+    registry,
+)
+from sso.user.tests.factories import DataRetentionStatisticsFactory, UserFactory, UserProfileFactory
+
+
+@pytest.fixture
+def populated_cache():
+    get_version(USER_PAGE_CACHE_VERSION_KEY)
+    cache.set('unrelated', 'value')
+
+
+@pytest.mark.django_db
+def test_user_save_invalidates_dependent_keys_only(populated_cache, django_capture_on_commit_callbacks):
+    with django_capture_on_commit_callbacks(execute=True):
+        user = UserFactory()
+        cache.set(SESSION_USER_CACHE_KEY.format(user_id=user.pk), user)
+        user.save()
+
+    assert cache.get(SESSION_USER_CACHE_KEY.format(user_id=user.pk)) is None
+    assert cache.get(USER_PAGE_CACHE_VERSION_KEY) is None
+    assert cache.get('unrelated') == 'value'
+
+
+@pytest.mark.django_db
+def test_user_profile_save_evicts_session_user(django_capture_on_commit_callbacks):
+    with django_capture_on_commit_callbacks(execute=True):
+        profile = UserProfileFactory()
+        cache.set(SESSION_USER_CACHE_KEY.format(user_id=profile.user_id), profile.user)
+        profile.save()
+
+    assert cache.get(SESSION_USER_CACHE_KEY.format(user_id=profile.user_id)) is None
+
+
+@pytest.mark.django_db
+def test_unregistered_model_save_does_not_invalidate(populated_cache, django_capture_on_commit_callbacks):
+    with django_capture_on_commit_callbacks(execute=True) as callbacks:
+        DataRetentionStatisticsFactory()
+
+    assert callbacks == []
+    assert cache.get(USER_PAGE_CACHE_VERSION_KEY) is not None
+    assert cache.get('unrelated') == 'value'
+
+
+@pytest.mark.django_db
+def test_invalidation_counted_per_model(django_capture_on_commit_callbacks):
+    before = get_invalidation_counts().get('user.User', 0)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        UserFactory().delete()
+
+    assert get_invalidation_counts()['user.User'] == before + 2
+
+
+@pytest.mark.django_db
+def test_invalidation_deferred_until_commit(populated_cache, django_capture_on_commit_callbacks):
+    with django_capture_on_commit_callbacks(execute=True) as callbacks:
+        users = UserFactory.create_batch(3)
+        for user in users:
+            cache.set(SESSION_USER_CACHE_KEY.format(user_id=user.pk), user)
+            user.save()
+        assert cache.get(USER_PAGE_CACHE_VERSION_KEY) is not None
+
+    assert len(callbacks) == 1
+    assert cache.get_many([SESSION_USER_CACHE_KEY.format(user_id=user.pk) for user in users]) == {}
+    assert cache.get(USER_PAGE_CACHE_VERSION_KEY) is None
+
+
+@pytest.mark.django_db
+def test_invalidations_coalesced_into_one_pipeline(django_capture_on_commit_callbacks):
+    with django_capture_on_commit_callbacks(execute=False) as callbacks:
+        UserFactory.create_batch(3)
+
+    with mock.patch('core.cache_invalidation.get_redis_connection') as mock_get_redis_connection:
+        callbacks[0]()
+
+    mock_get_redis_connection().scan_iter.assert_not_called()
+    pipeline = mock_get_redis_connection().pipeline()
+    assert pipeline.delete.call_count == 1
+    # two keys per user, the user page version and the high-water mark of the users activity stream
+    assert len(pipeline.delete.call_args.args) == 8
+    pipeline.hincrby.assert_called_once_with('sso:cache-invalidations', 'user.User', 3)
+    pipeline.execute.assert_called_once_with()
+
+
+@pytest.mark.django_db
+def test_invalidation_rescheduled_after_savepoint_rollback(django_capture_on_commit_callbacks):
+    with django_capture_on_commit_callbacks(execute=False) as callbacks:
+        try:
+            with transaction.atomic():
+                UserFactory()
+                raise ValueError
+        except ValueError:
+            pass
+        UserFactory()
+
+    assert callbacks == [registry.flush]
+
+
+def test_registry_respects_save_and_delete_flags():
+    registry = InvalidationRegistry()
+    registry.register('user.User', keys=lambda user: [f'saved:{user.pk}'], on_delete=False)
+    registry.register('user.User', keys=lambda user: [f'deleted:{user.pk}'], on_save=False)
+    user = UserFactory.build(pk=1)
+
+    assert registry.get_stale_keys(user) == {'saved:1'}
+    assert registry.get_stale_keys(user, deleted=True) == {'deleted:1'}
+
+
+def test_get_version():
+    version = get_version('sso:test-version')
+
+    assert get_version('sso:test-version') == version
+    cache.delete('sso:test-version')
+    assert get_version('sso:test-version') != version
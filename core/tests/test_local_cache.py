@@ -0,0 +1,38 @@
+from freezegun import freeze_time
+
+from core.local_cache import LocalLRUCache
+
+
+def test_local_cache_bounded():
+    cache = LocalLRUCache(max_size=2)
+
+    cache.set('a', 1, timeout=60)
+    cache.set('b', 2, timeout=60)
+    assert cache.get('a') == 1
+    cache.set('c', 3, timeout=60)
+
+    # the least recently used entry is dropped to make room
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+
+
+def test_local_cache_expires():
+    cache = LocalLRUCache(max_size=2)
+
+    with freeze_time('2026-01-01 12:00:00'):
+        cache.set('a', 1, timeout=60)
+        assert cache.add('a', 2, timeout=60) is False
+    with freeze_time('2026-01-01 12:01:01'):
+        assert cache.get('a') is None
+        assert cache.add('a', 2, timeout=60) is True
+        assert cache.get('a') == 2
+
+
+def test_local_cache_clear():
+    cache = LocalLRUCache(max_size=2)
+    cache.set('a', 1, timeout=60)
+
+    cache.clear()
+
+    assert cache.get('a') is None
@@ -3,7 +3,10 @@ from django.http import HttpResponse
 from django.test.client import Client
 from django.urls import reverse
 
+from core.cache_invalidation import USER_PAGE_CACHE_VERSION_KEY, get_version
+from core.middleware import FetchFromCacheMiddleware, page_cache_version
 from core.tests.test_helpers import reload_urlconf
+from sso.api.views_user import LastLoginAPIView
 from sso.user.tests import factories
 
 AUTHENTICATION_BACKENDS_CLASSES = (
@@ -80,3 +83,22 @@ def test_admin_permission_middleware_authorised_with_staff(client, settings, adm
     response = client.get(reverse('admin:login'))
 
     assert response.status_code == 302
+
+
+@pytest.mark.django_db
+def test_page_cache_version_reset_after_response(client):
+    client.get(reverse('api:last-login'))
+
+    assert page_cache_version.get() is None
+
+
+def test_page_cache_version_only_for_views_that_declare_one(rf):
+    middleware = FetchFromCacheMiddleware(lambda request: HttpResponse())
+    request = rf.get('/')
+
+    middleware.process_view(request, lambda request: HttpResponse(), (), {})
+    assert page_cache_version.get() is None
+
+    middleware.process_view(request, LastLoginAPIView.as_view(), (), {})
+    assert page_cache_version.get() == get_version(USER_PAGE_CACHE_VERSION_KEY)
+    page_cache_version.reset(request._page_cache_version_token)
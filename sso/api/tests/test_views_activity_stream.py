@@ -1,14 +1,52 @@
 import datetime
+import gzip
+import json
+from unittest import mock
 
 import mohawk
 import pytest
+from django.core.cache import cache
 from django.core.management import call_command
+from django.db import connection, transaction
 from freezegun import freeze_time
+from redis.exceptions import ConnectionError
 from rest_framework import status
 from rest_framework.reverse import reverse
 from rest_framework.test import APIClient
 
-from sso.user.tests.factories import UserFactory, UserProfileFactory
+from core.signals import ACTIVITY_STREAM_FEED_MODELS
+from sso.api.views_activity_stream import (
+    ActivityStreamDirectorySSOLessonsCompleted,
+    ActivityStreamDirectorySSOUserAnswersVFM,
+    ActivityStreamDirectorySSOUserData,
+    ActivityStreamDirectorySSOUserPageViews,
+    ActivityStreamDirectorySSOUserProfiles,
+    ActivityStreamDirectorySSOUsers,
+    ActivityStreamDirectorySSOUsersPagination,
+    ActivityStreamFeed,
+    AdaptivePageSize,
+    BulkExportMixin,
+    get_adaptive_page_size,
+)
+from sso.user.models import (
+    LessonCompleted,
+    Question,
+    ServicePage,
+    User,
+    UserAnswer,
+    UserData,
+    UserPageView,
+    UserProfile,
+)
+from sso.user.tests.factories import (
+    LessonCompletedFactory,
+    QuestionFactory,
+    UserAnswerFactory,
+    UserDataFactory,
+    UserFactory,
+    UserPageViewFactory,
+    UserProfileFactory,
+)
 
 WHITELISTED_X_FORWARDED_FOR_HEADER = '1.2.3.4, ' + '4.5.5.5, ' + '3.5.5.5, ' + '2.5.5.5, ' + '1.5.5.5'
 
@@ -168,6 +206,51 @@ def test_if_61_seconds_in_past_401_returned(api_client):
     assert response.json() == error
 
 
+@pytest.mark.django_db
+def test_replayed_request_401_returned(api_client, settings):
+    settings.ALLOWED_IPS = ['1.2.3.4', '123.123.123.123']
+    auth = _auth_sender().request_header
+
+    responses = [
+        api_client.get(_url(), content_type='', HTTP_AUTHORIZATION=auth, HTTP_X_FORWARDED_FOR='1.2.3.4')
+        for _ in range(2)
+    ]
+
+    assert responses[0].status_code == status.HTTP_200_OK
+    assert responses[1].status_code == status.HTTP_401_UNAUTHORIZED
+    assert responses[1].json() == {'detail': 'Incorrect authentication credentials.'}
+
+
+@pytest.mark.django_db
+def test_nonce_kept_until_timestamp_expires(api_client, settings):
+    settings.ALLOWED_IPS = ['1.2.3.4', '123.123.123.123']
+    with freeze_time(datetime.datetime.now() - datetime.timedelta(seconds=20)):
+        sender = _auth_sender()
+
+    with mock.patch('sso.api.views_activity_stream.cache.add', wraps=cache.add) as mock_add:
+        api_client.get(
+            _url(), content_type='', HTTP_AUTHORIZATION=sender.request_header, HTTP_X_FORWARDED_FOR='1.2.3.4'
+        )
+
+    assert mock_add.call_count == 1
+    assert 39 <= mock_add.call_args.args[2] <= 40
+
+
+@pytest.mark.django_db
+def test_replay_detected_in_process_when_cache_unavailable(api_client, settings):
+    settings.ALLOWED_IPS = ['1.2.3.4', '123.123.123.123']
+    auth = _auth_sender().request_header
+
+    with mock.patch('sso.api.views_activity_stream.cache.add', side_effect=ConnectionError('Connection refused')):
+        responses = [
+            api_client.get(_url(), content_type='', HTTP_AUTHORIZATION=auth, HTTP_X_FORWARDED_FOR='1.2.3.4')
+            for _ in range(2)
+        ]
+
+    assert responses[0].status_code == status.HTTP_200_OK
+    assert responses[1].status_code == status.HTTP_401_UNAUTHORIZED
+
+
 @pytest.mark.django_db
 def test_empty_object_returned_with_authentication(api_client, settings):
     """If the Authorization and X-Forwarded-For headers are correct, then
@@ -344,3 +427,491 @@ def test_activity_stream_list_user_answers_vfm_endpoint(api_client, settings):
     ]
     assert data['next'] is None
     assert data['previous'] is not None
+
+
+def _get_feed(api_client, url):
+    sender = _auth_sender(url=lambda: url)
+    return api_client.get(
+        url,
+        content_type='',
+        HTTP_AUTHORIZATION=sender.request_header,
+        HTTP_X_FORWARDED_FOR='1.2.3.4, 123.123.123.123',
+    )
+
+
+@pytest.mark.django_db
+def test_activity_stream_page_size_param(api_client, settings):
+    settings.ALLOWED_IPS = ['1.2.3.4', '123.123.123.123']
+    UserFactory.create_batch(7)
+
+    data = _get_feed(api_client, _url_activity_stream_users() + '?page_size=3').json()
+
+    assert len(data['orderedItems']) == 3
+    assert len(_get_feed(api_client, data['next']).json()['orderedItems']) == 3
+
+
+@pytest.mark.django_db
+@mock.patch.object(ActivityStreamDirectorySSOUsersPagination, 'max_page_size', 4)
+def test_activity_stream_page_size_param_bounded(api_client, settings):
+    settings.ALLOWED_IPS = ['1.2.3.4', '123.123.123.123']
+    UserFactory.create_batch(7)
+
+    response = _get_feed(api_client, _url_activity_stream_users() + '?page_size=100')
+
+    assert len(response.json()['orderedItems']) == 4
+
+
+@pytest.mark.django_db
+def test_activity_stream_adaptive_page_size(api_client, settings):
+    settings.ALLOWED_IPS = ['1.2.3.4', '123.123.123.123']
+    settings.ACTIVITY_STREAM_ADAPTIVE_PAGE_TARGET_MS = 500
+    UserFactory.create_batch(15)
+    get_adaptive_page_size.cache_clear()
+    # recent pages took 500ms for every 12 rows
+    get_adaptive_page_size('User').record(rows=12, seconds=0.5)
+
+    response = _get_feed(api_client, _url_activity_stream_users() + '?page_size=auto')
+
+    assert len(response.json()['orderedItems']) == 12
+    assert get_adaptive_page_size('User').seconds_per_row != 0.5 / 12
+    get_adaptive_page_size.cache_clear()
+
+
+def test_adaptive_page_size_follows_recent_timings():
+    page_size = AdaptivePageSize(target_seconds=1, min_page_size=10, max_page_size=1000, default_page_size=100)
+
+    assert page_size.get_page_size() == 100
+    page_size.record(rows=100, seconds=0.5)
+    assert page_size.get_page_size() == 200
+    page_size.record(rows=100, seconds=5.5)
+    assert page_size.get_page_size() == 66
+    page_size.record(rows=0, seconds=1)
+    assert page_size.get_page_size() == 66
+
+
+def test_adaptive_page_size_bounded():
+    page_size = AdaptivePageSize(target_seconds=1, min_page_size=10, max_page_size=1000, default_page_size=100)
+
+    page_size.record(rows=10, seconds=100)
+    assert page_size.get_page_size() == 10
+
+    page_size = AdaptivePageSize(target_seconds=1, min_page_size=10, max_page_size=1000, default_page_size=100)
+    page_size.record(rows=10, seconds=0.0001)
+    assert page_size.get_page_size() == 1000
+
+
+# Data Workspace pulls these feeds continuously, so a page must cost the same number of queries whatever its size.
+@pytest.mark.django_db
+@pytest.mark.parametrize('page_size', (2, 20))
+def test_activity_stream_list_users_query_budget(api_client, settings, page_size, django_assert_num_queries):
+    settings.ALLOWED_IPS = ['1.2.3.4', '123.123.123.123']
+    UserProfileFactory.create_batch(10)
+    UserFactory.create_batch(10)
+
+    with mock.patch.object(ActivityStreamDirectorySSOUsersPagination, 'page_size', page_size):
+        with django_assert_num_queries(1):
+            response = _get_feed(api_client, _url_activity_stream_users())
+
+    assert response.status_code == status.HTTP_200_OK
+    assert len(response.json()['orderedItems']) == page_size
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('page_size', (2, 20))
+def test_activity_stream_list_user_answers_vfm_query_budget(api_client, settings, page_size, django_assert_num_queries):
+    settings.ALLOWED_IPS = ['1.2.3.4', '123.123.123.123']
+    UserAnswerFactory.create_batch(10, question__question_type='RADIO')
+    UserAnswerFactory.create_batch(10, question__question_type='MULTI_SELECT', answer=['a', 'b'])
+
+    with mock.patch.object(ActivityStreamDirectorySSOUsersPagination, 'page_size', page_size):
+        with django_assert_num_queries(1):
+            response = _get_feed(api_client, _url_activity_stream_user_answers_vfm())
+
+    assert response.status_code == status.HTTP_200_OK
+    assert len(response.json()['orderedItems']) == page_size
+
+
+def _read_export(response):
+    return [json.loads(line) for line in gzip.decompress(b''.join(response.streaming_content)).splitlines()]
+
+
+@pytest.mark.django_db
+@mock.patch.object(BulkExportMixin, 'export_chunk_size', 2)
+def test_activity_stream_users_export(api_client, settings):
+    settings.ALLOWED_IPS = ['1.2.3.4', '123.123.123.123']
+    users = UserFactory.create_batch(5)
+
+    response = _get_feed(api_client, _url_activity_stream_users() + '?export=ndjson')
+    lines = _read_export(response)
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response['Content-Type'] == 'application/x-ndjson'
+    assert response['Content-Encoding'] == 'gzip'
+    assert [line.get('id') for line in lines] == [
+        f'dit:DirectorySSO:User:{users[0].pk}:Update',
+        f'dit:DirectorySSO:User:{users[1].pk}:Update',
+        None,
+        f'dit:DirectorySSO:User:{users[2].pk}:Update',
+        f'dit:DirectorySSO:User:{users[3].pk}:Update',
+        None,
+        f'dit:DirectorySSO:User:{users[4].pk}:Update',
+        None,
+    ]
+    assert lines[2] == {'position': str(users[1].pk)}
+    assert lines[0]['object']['dit:DirectorySSO:User:email'] == users[0].email
+
+    response = _get_feed(api_client, _url_activity_stream_users() + f'?export=ndjson&position={users[3].pk}')
+
+    assert _read_export(response) == lines[6:]
+
+
+@pytest.mark.django_db
+def test_activity_stream_user_answers_vfm_export(api_client, settings):
+    settings.ALLOWED_IPS = ['1.2.3.4', '123.123.123.123']
+    answers = UserAnswerFactory.create_batch(3)
+
+    response = _get_feed(api_client, _url_activity_stream_user_answers_vfm() + '?export=ndjson')
+    lines = _read_export(response)
+
+    assert [line['object']['id'] for line in lines[:-1]] == [
+        f'dit:DirectorySSO:UserAnswer:{answer.pk}' for answer in answers
+    ]
+    assert lines[-1] == {'position': str(answers[-1].pk)}
+
+
+@pytest.mark.django_db
+def test_activity_stream_export_invalid_position(api_client, settings):
+    settings.ALLOWED_IPS = ['1.2.3.4', '123.123.123.123']
+
+    response = _get_feed(api_client, _url_activity_stream_users() + '?export=ndjson&position=invalid')
+
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    'url_name,factory,expected_object',
+    (
+        (
+            'activity-stream-user-page-views',
+            lambda: UserPageViewFactory(service_page__service__name='great-cms', service_page__page_name='home'),
+            lambda page_view: {
+                'id': f'dit:DirectorySSO:UserPageView:{page_view.pk}',
+                'type': 'dit:DirectorySSO:UserPageView',
+                'dit:DirectorySSO:UserPageView:user:id': page_view.user_id,
+                'dit:DirectorySSO:UserPageView:user:hashed_uuid': page_view.user.hashed_uuid,
+                'dit:DirectorySSO:UserPageView:service': 'great-cms',
+                'dit:DirectorySSO:UserPageView:page': 'home',
+                'dit:DirectorySSO:UserPageView:created': page_view.created.isoformat().replace('+00:00', 'Z'),
+            },
+        ),
+        (
+            'activity-stream-lessons-completed',
+            lambda: LessonCompletedFactory(service__name='great-cms', lesson_page='lesson-1', lesson=1, module=2),
+            lambda lesson: {
+                'id': f'dit:DirectorySSO:LessonCompleted:{lesson.pk}',
+                'type': 'dit:DirectorySSO:LessonCompleted',
+                'dit:DirectorySSO:LessonCompleted:user:id': lesson.user_id,
+                'dit:DirectorySSO:LessonCompleted:user:hashed_uuid': lesson.user.hashed_uuid,
+                'dit:DirectorySSO:LessonCompleted:service': 'great-cms',
+                'dit:DirectorySSO:LessonCompleted:lesson_page': 'lesson-1',
+                'dit:DirectorySSO:LessonCompleted:lesson': 1,
+                'dit:DirectorySSO:LessonCompleted:module': 2,
+                'dit:DirectorySSO:LessonCompleted:created': lesson.created.isoformat().replace('+00:00', 'Z'),
+            },
+        ),
+        (
+            'activity-stream-user-data',
+            lambda: UserDataFactory(name='UserMarkets', data={'markets': ['FR']}),
+            lambda user_data: {
+                'id': f'dit:DirectorySSO:UserData:{user_data.pk}',
+                'type': 'dit:DirectorySSO:UserData',
+                'dit:DirectorySSO:UserData:user:id': user_data.user_id,
+                'dit:DirectorySSO:UserData:user:hashed_uuid': user_data.user.hashed_uuid,
+                'dit:DirectorySSO:UserData:name': 'UserMarkets',
+                'dit:DirectorySSO:UserData:data': {'markets': ['FR']},
+            },
+        ),
+        (
+            'activity-stream-user-profiles',
+            lambda: UserProfileFactory(first_name='Jim', last_name='Cross', job_title=None, segment='SUSTAIN'),
+            lambda profile: {
+                'id': f'dit:DirectorySSO:UserProfile:{profile.pk}',
+                'type': 'dit:DirectorySSO:UserProfile',
+                'dit:DirectorySSO:UserProfile:user:id': profile.user_id,
+                'dit:DirectorySSO:UserProfile:user:hashed_uuid': profile.user.hashed_uuid,
+                'dit:DirectorySSO:UserProfile:first_name': 'Jim',
+                'dit:DirectorySSO:UserProfile:last_name': 'Cross',
+                'dit:DirectorySSO:UserProfile:job_title': None,
+                'dit:DirectorySSO:UserProfile:mobile_phone_number': profile.mobile_phone_number,
+                'dit:DirectorySSO:UserProfile:segment': 'SUSTAIN',
+            },
+        ),
+    ),
+)
+def test_activity_stream_model_feeds(api_client, settings, url_name, factory, expected_object):
+    settings.ALLOWED_IPS = ['1.2.3.4', '123.123.123.123']
+    instances = [factory() for _ in range(3)]
+
+    response = _get_feed(api_client, 'http://testserver' + reverse(f'api:{url_name}'))
+    data = response.json()
+
+    assert response.status_code == status.HTTP_200_OK
+    assert data['orderedItems'][0]['object'] == expected_object(instances[0])
+    assert data['orderedItems'][0]['published'] == instances[0].modified.isoformat().replace('+00:00', 'Z')
+    assert len(data['orderedItems']) == 2
+
+    response = _get_feed(api_client, data['next'])
+
+    assert [item['object']['id'] for item in response.json()['orderedItems']] == [expected_object(instances[2])['id']]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    'url_name,factory',
+    (
+        ('activity-stream-user-page-views', UserPageViewFactory),
+        ('activity-stream-lessons-completed', LessonCompletedFactory),
+        ('activity-stream-user-data', UserDataFactory),
+        ('activity-stream-user-profiles', UserProfileFactory),
+    ),
+)
+@pytest.mark.parametrize('page_size', (2, 20))
+def test_activity_stream_model_feeds_query_budget(
+    api_client, settings, url_name, factory, page_size, django_assert_num_queries
+):
+    settings.ALLOWED_IPS = ['1.2.3.4', '123.123.123.123']
+    factory.create_batch(20)
+
+    with mock.patch.object(ActivityStreamDirectorySSOUsersPagination, 'page_size', page_size):
+        with django_assert_num_queries(1):
+            response = _get_feed(api_client, 'http://testserver' + reverse(f'api:{url_name}'))
+
+    assert len(response.json()['orderedItems']) == page_size
+
+
+@pytest.mark.django_db
+def test_activity_stream_feed_not_served_from_site_cache(api_client, settings):
+    settings.ALLOWED_IPS = ['1.2.3.4', '123.123.123.123']
+    UserFactory.create_batch(3)
+
+    response = _get_feed(api_client, _url_activity_stream_users())
+
+    assert 'private' in response['Cache-Control']
+    assert api_client.get(_url_activity_stream_users()).status_code == status.HTTP_401_UNAUTHORIZED
+
+
+@pytest.mark.django_db
+def test_activity_stream_feed_page_cached(api_client, settings, django_assert_num_queries):
+    settings.ALLOWED_IPS = ['1.2.3.4', '123.123.123.123']
+    UserFactory.create_batch(3)
+    first = _get_feed(api_client, _url_activity_stream_users())
+
+    sender = _auth_sender(url=_url_activity_stream_users)
+    with django_assert_num_queries(0):
+        response = api_client.get(
+            _url_activity_stream_users(),
+            content_type='',
+            HTTP_AUTHORIZATION=sender.request_header,
+            HTTP_X_FORWARDED_FOR='1.2.3.4, 123.123.123.123',
+        )
+
+    assert response.content == first.content
+    assert response['Server-Authorization'] != first['Server-Authorization']
+    sender.accept_response(
+        response['Server-Authorization'], content=response.content, content_type=response['Content-Type']
+    )
+
+
+@pytest.mark.django_db
+def test_activity_stream_feed_page_evicted_on_change(api_client, settings, django_capture_on_commit_callbacks):
+    settings.ALLOWED_IPS = ['1.2.3.4', '123.123.123.123']
+    with django_capture_on_commit_callbacks(execute=True):
+        user = UserFactory()
+    _get_feed(api_client, _url_activity_stream_users())
+
+    with django_capture_on_commit_callbacks(execute=True):
+        user.email = 'changed@example.com'
+        user.save()
+    response = _get_feed(api_client, _url_activity_stream_users())
+
+    assert response.json()['orderedItems'][0]['object']['dit:DirectorySSO:User:email'] == 'changed@example.com'
+
+
+@pytest.mark.django_db
+def test_activity_stream_feed_page_kept_on_related_change(
+    api_client, settings, django_capture_on_commit_callbacks, django_assert_num_queries
+):
+    settings.ALLOWED_IPS = ['1.2.3.4', '123.123.123.123']
+    with django_capture_on_commit_callbacks(execute=True):
+        page_view = UserPageViewFactory()
+    url = 'http://testserver' + reverse('api:activity-stream-user-page-views')
+    first = _get_feed(api_client, url)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        page_view.user.last_login = datetime.datetime.now(datetime.timezone.utc)
+        page_view.user.save()
+    with django_assert_num_queries(0):
+        response = _get_feed(api_client, url)
+
+    assert response.content == first.content
+
+
+@pytest.mark.django_db
+def test_activity_stream_feed_followed_page_kept_on_save(
+    api_client, settings, django_capture_on_commit_callbacks, django_assert_num_queries
+):
+    settings.ALLOWED_IPS = ['1.2.3.4', '123.123.123.123']
+    with django_capture_on_commit_callbacks(execute=True):
+        users = UserFactory.create_batch(3)
+    first = _get_feed(api_client, _url_activity_stream_users())
+
+    with django_capture_on_commit_callbacks(execute=True):
+        users[0].email = 'changed@example.com'
+        users[0].save()
+    with django_assert_num_queries(0):
+        response = _get_feed(api_client, _url_activity_stream_users())
+    last = _get_feed(api_client, response.json()['next'])
+
+    assert response.content == first.content
+    assert [item['object']['id'] for item in last.json()['orderedItems']] == [
+        f'dit:DirectorySSO:User:{users[2].pk}',
+        f'dit:DirectorySSO:User:{users[0].pk}',
+    ]
+    assert last.json()['orderedItems'][1]['object']['dit:DirectorySSO:User:email'] == 'changed@example.com'
+
+
+@pytest.mark.django_db
+def test_activity_stream_feed_followed_page_evicted_on_delete(api_client, settings, django_capture_on_commit_callbacks):
+    settings.ALLOWED_IPS = ['1.2.3.4', '123.123.123.123']
+    with django_capture_on_commit_callbacks(execute=True):
+        users = UserFactory.create_batch(3)
+    _get_feed(api_client, _url_activity_stream_users())
+
+    with django_capture_on_commit_callbacks(execute=True):
+        users[1].delete()
+    response = _get_feed(api_client, _url_activity_stream_users())
+
+    assert [item['object']['id'] for item in response.json()['orderedItems']] == [
+        f'dit:DirectorySSO:User:{users[0].pk}',
+        f'dit:DirectorySSO:User:{users[2].pk}',
+    ]
+
+
+@pytest.mark.django_db
+def test_activity_stream_user_answers_labels_built_once_per_question():
+    question = QuestionFactory(
+        question_type='MULTI_SELECT', question_choices={'options': [{'value': 'a', 'label': 'A'}]}
+    )
+    UserAnswerFactory.create_batch(3, question=question, answer=['a', 'missing', {'unhashable': True}])
+    view = ActivityStreamDirectorySSOUserAnswersVFM()
+
+    with mock.patch.object(
+        Question, 'get_choice_labels', autospec=True, side_effect=Question.get_choice_labels
+    ) as mock_get_choice_labels:
+        items = view.get_activities(list(view.get_queryset()))
+
+    assert [item['object']['dit:DirectorySSO:UserAnswer:answer_label'] for item in items] == [['A', '', '']] * 3
+    assert mock_get_choice_labels.call_count == 1
+
+
+def test_activity_stream_feed_models_registered():
+    feeds = ActivityStreamFeed.__subclasses__()
+
+    assert {feed.model._meta.label for feed in feeds} == set(ACTIVITY_STREAM_FEED_MODELS)
+    assert all(feed.activity_type == feed.model._meta.object_name for feed in feeds)
+
+
+def create_feed_rows(count):
+    users = User.objects.bulk_create(User(email=f'{i}@example.com') for i in range(count))
+    UserProfile.objects.bulk_create(UserProfile(user=user) for user in users)
+    question = QuestionFactory()
+    UserAnswer.objects.bulk_create(UserAnswer(user=user, question=question) for user in users)
+    service_page = ServicePage.objects.create(service=question.service, page_name='home')
+    UserPageView.objects.bulk_create(UserPageView(user=user, service_page=service_page) for user in users)
+    LessonCompleted.objects.bulk_create(
+        LessonCompleted(user=user, service=question.service, lesson_page='lesson', lesson=1, module=1) for user in users
+    )
+    UserData.objects.bulk_create(UserData(user=user, name='UserMarkets') for user in users)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    'view_class,index_name',
+    (
+        (ActivityStreamDirectorySSOUsers, 'user_user_modified_id_idx'),
+        (ActivityStreamDirectorySSOUserAnswersVFM, 'user_answer_modified_id_idx'),
+        (ActivityStreamDirectorySSOUserPageViews, 'user_pageview_modified_id_idx'),
+        (ActivityStreamDirectorySSOLessonsCompleted, 'user_lesson_modified_id_idx'),
+        (ActivityStreamDirectorySSOUserData, 'user_data_modified_id_idx'),
+        (ActivityStreamDirectorySSOUserProfiles, 'user_profile_modified_id_idx'),
+    ),
+)
+def test_activity_stream_page_query_uses_modified_id_index(view_class, index_name):
+    create_feed_rows(2000)
+    model = view_class.model
+    with connection.cursor() as cursor:
+        cursor.execute(f'ANALYZE {model._meta.db_table}')
+    position = model.objects.order_by('modified', 'id').values_list('modified', flat=True)[1800]
+
+    # the query CursorPagination makes for a page deep into the feed
+    plan = view_class().get_queryset().filter(modified__gte=position).order_by('modified', 'id')[:3].explain()
+
+    assert f'Index Scan using {index_name}' in plan
+
+
+def _url_activity_stream_outbox():
+    return 'http://testserver' + reverse('api:activity-stream-outbox')
+
+
+# events are only served once the transaction that wrote them has finished
+@pytest.mark.django_db(transaction=True)
+def test_activity_stream_outbox_endpoint(api_client, settings):
+    settings.ALLOWED_IPS = ['1.2.3.4', '123.123.123.123']
+    user = UserFactory()
+    user_id = user.pk
+    answer = UserAnswerFactory(user=user)
+    user.delete()
+
+    response = _get_feed(api_client, _url_activity_stream_outbox())
+    data = response.json()
+
+    assert response.status_code == status.HTTP_200_OK
+    assert [(item['type'], item['object']['type']) for item in data['orderedItems']] == [
+        ('Update', 'dit:DirectorySSO:User'),
+        ('Update', 'dit:DirectorySSO:UserAnswer'),
+    ]
+    assert data['orderedItems'][0]['object']['dit:DirectorySSO:User:user:id'] == user_id
+    assert data['next'] is not None
+
+    items = data['orderedItems']
+    while data['next']:
+        data = _get_feed(api_client, data['next']).json()
+        items += data['orderedItems']
+
+    assert [(item['type'], item['object']['id']) for item in items][-2:] == [
+        ('Delete', f'dit:DirectorySSO:UserAnswer:{answer.pk}'),
+        ('Delete', f'dit:DirectorySSO:User:{user_id}'),
+    ]
+    assert len({item['id'] for item in items}) == len(items)
+
+
+@pytest.mark.django_db(transaction=True)
+def test_activity_stream_outbox_skips_running_transactions(api_client, settings):
+    settings.ALLOWED_IPS = ['1.2.3.4', '123.123.123.123']
+    UserFactory()
+
+    with transaction.atomic():
+        UserFactory()
+        response = _get_feed(api_client, _url_activity_stream_outbox())
+
+    assert len(response.json()['orderedItems']) == 1
+
+
+@pytest.mark.django_db
+def test_activity_stream_outbox_invalid_cursor(api_client, settings):
+    settings.ALLOWED_IPS = ['1.2.3.4', '123.123.123.123']
+
+    response = _get_feed(api_client, _url_activity_stream_outbox() + '?cursor=invalid')
+
+    assert response.status_code == status.HTTP_404_NOT_FOUND
@@ -1,14 +1,17 @@
 from datetime import datetime
+from unittest import mock
 
 import pytest
+from allauth.socialaccount.models import SocialAccount
 from django.test.client import Client
 from django.urls import reverse
 from django.utils.timezone import make_aware
 from rest_framework import status
 from rest_framework.test import APIClient
 
+from sso.user.hashing import PasswordHashingUnavailable
 from sso.user.models import User
-from sso.user.tests.factories import UserFactory
+from sso.user.tests.factories import UserFactory, UserProfileFactory
 
 
 def setup_data(email='user@example.com'):
@@ -70,6 +73,82 @@ def test_get_session_user_valid_session_key_no_user(api_client):
     assert response.status_code == status.HTTP_404_NOT_FOUND
 
 
+@pytest.mark.django_db
+def test_get_session_user_num_queries(api_client, django_assert_num_queries):
+    user, user_session = setup_data()
+    UserProfileFactory(user=user)
+    SocialAccount.objects.create(user=user, provider='google', uid='1', extra_data={'picture': 'a.png'})
+
+    # user and profile, social accounts
+    with django_assert_num_queries(2):
+        response = api_client.get(reverse('api:session-user'), data={'session_key': user_session.session_key})
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data['social_login'] is True
+    assert response.data['user_profile']['social_account'] == 'google'
+
+
+@pytest.mark.django_db
+def test_get_session_user_not_modified(api_client, django_assert_num_queries):
+    user, user_session = setup_data()
+    url = reverse('api:session-user')
+    response = api_client.get(url, data={'session_key': user_session.session_key})
+    etag = response['ETag']
+
+    assert response.status_code == status.HTTP_200_OK
+    assert 'private' in response['Cache-Control']
+
+    with django_assert_num_queries(0):
+        response = api_client.get(url, data={'session_key': user_session.session_key}, HTTP_IF_NONE_MATCH=etag)
+
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+    assert response['ETag'] == etag
+    assert response.content == b''
+
+
+# the cached ETag is evicted on commit
+@pytest.mark.django_db(transaction=True)
+def test_get_session_user_etag_changes_with_profile(api_client):
+    user, user_session = setup_data()
+    url = reverse('api:session-user')
+    etag = api_client.get(url, data={'session_key': user_session.session_key})['ETag']
+
+    UserProfileFactory(user=user)
+    response = api_client.get(url, data={'session_key': user_session.session_key}, HTTP_IF_NONE_MATCH=etag)
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response['ETag'] != etag
+
+
+@pytest.mark.django_db
+def test_session_user_batch(api_client):
+    user, user_session = setup_data()
+    other_user, other_user_session = setup_data(email='other@example.com')
+
+    response = api_client.post(
+        reverse('api:session-user-batch'),
+        data={'session_keys': [user_session.session_key, other_user_session.session_key, 'non-existent']},
+        format='json',
+    )
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json().keys() == {user_session.session_key, other_user_session.session_key, 'non-existent'}
+    assert response.json()[user_session.session_key]['email'] == user.email
+    assert response.json()[other_user_session.session_key]['id'] == other_user.id
+    assert response.json()['non-existent'] is None
+
+
+@pytest.mark.django_db
+def test_session_user_batch_too_many_keys(api_client, settings):
+    response = api_client.post(
+        reverse('api:session-user-batch'),
+        data={'session_keys': [f'key-{i}' for i in range(settings.SSO_SESSION_USER_BATCH_MAX_SIZE + 1)]},
+        format='json',
+    )
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
 @pytest.mark.django_db
 def test_get_last_login(api_client):
     users = UserFactory.create_batch(5)
@@ -90,6 +169,22 @@ def test_get_last_login(api_client):
     assert response.json() == expected
 
 
+@pytest.mark.django_db
+def test_get_last_login_cached_until_a_user_changes(api_client, django_capture_on_commit_callbacks):
+    with django_capture_on_commit_callbacks(execute=True):
+        user = UserFactory()
+    api_client.get(reverse('api:last-login'))
+
+    with django_capture_on_commit_callbacks(execute=True):
+        other_user = UserFactory()
+        # the page cache answers before the view runs
+        assert len(api_client.get(reverse('api:last-login')).json()) == 1
+
+    response = api_client.get(reverse('api:last-login'))
+
+    assert sorted(item['id'] for item in response.json()) == sorted([user.id, other_user.id])
+
+
 @pytest.mark.django_db
 def test_get_last_login_with_params(api_client):
     user1 = UserFactory(last_login=make_aware(datetime(2016, 12, 25)))
@@ -174,3 +269,17 @@ def test_check_password_valid_session_key_no_user(api_client):
     )
 
     assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.django_db
+@mock.patch.object(User, 'check_password', side_effect=PasswordHashingUnavailable)
+def test_check_password_no_hashing_slot(mock_check_password, api_client):
+    user, user_session = setup_data()
+
+    response = api_client.post(
+        reverse('api:password-check'),
+        data={'session_key': user_session._session_key, 'password': 'pass'},
+    )
+
+    assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert response['Retry-After'] == '1'
@@ -1,22 +1,53 @@
+import datetime
+import functools
+import hashlib
+import json
 import logging
+import time
+import zlib
+
+import sentry_sdk
 from dbt_copilot_python.utility import is_copilot
 from django.conf import settings
+from django.core.cache import cache
+from django.db.models.expressions import RawSQL
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.cache import patch_cache_control
 from django.utils.crypto import constant_time_compare
 from django.utils.decorators import decorator_from_middleware
+from django_redis.exceptions import ConnectionInterrupted
 from mohawk import Receiver
 from mohawk.exc import HawkFail
+from redis.exceptions import RedisError
+from rest_framework import permissions
 from rest_framework.authentication import BaseAuthentication
-from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.exceptions import AuthenticationFailed, NotFound
+from rest_framework.fields import DateTimeField
 from rest_framework.generics import ListAPIView
-from rest_framework.pagination import CursorPagination
+from rest_framework.pagination import BasePagination, CursorPagination
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
 from rest_framework.viewsets import ViewSet
-from rest_framework import permissions
-
-import sentry_sdk
 
-from sso.user import serializers
-from sso.user.models import User, UserAnswer
+from core.cache_invalidation import (
+    ACTIVITY_STREAM_FEED_HIGH_WATER_MARK_CACHE_KEY,
+    ACTIVITY_STREAM_FEED_VERSION_CACHE_KEY,
+    get_version,
+)
+from core.local_cache import LocalLRUCache
+from sso.user.models import (
+    LessonCompleted,
+    OutboxEvent,
+    Question,
+    User,
+    UserAnswer,
+    UserData,
+    UserPageView,
+    UserProfile,
+)
+from sso.user.serializers import get_answer_label
 
 logger = logging.getLogger(__name__)
 
@@ -33,6 +64,11 @@ ADDED_IPS = (
 )
 CLIENT_IP_ERROR_MESSAGE = 'X Forward For checks failed'
 
+ACTIVITY_STREAM_PAGE_CACHE_KEY = 'sso:activity-stream-page:{activity_type}:{version}:{url_hash}'
+ADAPTIVE_MIN_PAGE_SIZE = 10
+NONCE_CACHE_KEY = 'sso:activity-stream-nonce:{access_key_id}:{nonce}'
+LOCAL_NONCE_STORE_SIZE = 10000
+
 
 def _lookup_credentials(access_key_id):
     """Raises a HawkFail if the passed ID is not equal to
@@ -48,6 +84,27 @@ def _lookup_credentials(access_key_id):
     }
 
 
+# used while the cache is unreachable. It only sees the requests served by this process, so it narrows rather than
+# closes the replay window during a cache outage.
+_local_nonces = LocalLRUCache(max_size=LOCAL_NONCE_STORE_SIZE)
+
+
+def _seen_nonce(access_key_id, nonce, timestamp):
+    """Records the nonce, returning True if it has already been used
+
+    A single SET NX, which keeps the nonce for as long as its timestamp
+    would still be accepted.
+    """
+    key = NONCE_CACHE_KEY.format(access_key_id=access_key_id, nonce=nonce)
+    timeout = max(1, int(timestamp) + settings.ACTIVITY_STREAM_NONCE_EXPIRY_SECONDS - int(time.time()))
+    try:
+        return not cache.add(key, True, timeout)
+    except (ConnectionInterrupted, RedisError):
+        # django-redis re-raises the underlying Redis error when the server is down
+        logger.warning('Cache unavailable, checking activity stream nonce in process', exc_info=True)
+        return not _local_nonces.add(key, True, timeout)
+
+
 def _authorise(request):
     """Raises a HawkFail if the passed request cannot be authenticated"""
     return Receiver(
@@ -57,6 +114,8 @@ def _authorise(request):
         request.method,
         content=request.body,
         content_type=request.content_type,
+        seen_nonce=_seen_nonce,
+        timestamp_skew_in_seconds=settings.ACTIVITY_STREAM_NONCE_EXPIRY_SECONDS,
     )
 
 
@@ -130,11 +189,19 @@ class _ActivityStreamHawkResponseMiddleware:
         return response
 
 
-class ActivityStreamViewSet(ViewSet):
-    """List-only view set for the activity stream"""
+class ActivityStreamViewMixin:
+    authentication_classes = [_ActivityStreamAuthentication]
+    permission_classes = [_XForwardForCheck]
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        # FetchFromCacheMiddleware runs before authentication, so a page in the site-wide cache is served to anyone
+        patch_cache_control(response, private=True)
+        return response
 
-    authentication_classes = (_ActivityStreamAuthentication,)
-    permission_classes = (_XForwardForCheck,)
+
+class ActivityStreamViewSet(ActivityStreamViewMixin, ViewSet):
+    """List-only view set for the activity stream"""
 
     @decorator_from_middleware(_ActivityStreamHawkResponseMiddleware)
     def list(self, request):
@@ -142,92 +209,403 @@ class ActivityStreamViewSet(ViewSet):
         return Response({'secret': 'content-for-pen-test'})
 
 
+class ActivityStreamAPIView(ActivityStreamViewMixin, ListAPIView):
+    """Base for the Hawk-authenticated activity stream feeds"""
+
+
+class AdaptivePageSize:
+    """Picks the page size that keeps rendering a page under a target time.
+
+    The time taken per row is tracked as a moving average over the pages
+    recently rendered by this process, so pages grow while the database is
+    quiet and shrink when it is under load.
+    """
+
+    def __init__(self, target_seconds, min_page_size, max_page_size, default_page_size, smoothing=0.2):
+        self.target_seconds = target_seconds
+        self.min_page_size = min_page_size
+        self.max_page_size = max_page_size
+        self.default_page_size = default_page_size
+        self.smoothing = smoothing
+        self.seconds_per_row = None
+
+    def record(self, rows, seconds):
+        if not rows:
+            return
+        seconds_per_row = seconds / rows
+        if self.seconds_per_row is None:
+            self.seconds_per_row = seconds_per_row
+        else:
+            self.seconds_per_row += self.smoothing * (seconds_per_row - self.seconds_per_row)
+
+    def get_page_size(self):
+        if not self.seconds_per_row:
+            return self.default_page_size
+        return max(self.min_page_size, min(self.max_page_size, int(self.target_seconds / self.seconds_per_row)))
+
+
+@functools.lru_cache(maxsize=None)
+def get_adaptive_page_size(activity_type):
+    return AdaptivePageSize(
+        target_seconds=settings.ACTIVITY_STREAM_ADAPTIVE_PAGE_TARGET_MS / 1000,
+        min_page_size=min(ADAPTIVE_MIN_PAGE_SIZE, settings.ACTIVITY_STREAM_MAX_PAGE_SIZE),
+        max_page_size=settings.ACTIVITY_STREAM_MAX_PAGE_SIZE,
+        default_page_size=api_settings.PAGE_SIZE,
+    )
+
+
 class ActivityStreamDirectorySSOUsersPagination(CursorPagination):
+    """Cursor pagination by (modified, id).
+
+    Collectors can ask for up to ACTIVITY_STREAM_MAX_PAGE_SIZE rows with
+    `page_size`, or pass `page_size=auto` for the adaptive size of the feed.
+    """
+
     ordering = ('modified', 'id')
+    page_size_query_param = 'page_size'
+    max_page_size = settings.ACTIVITY_STREAM_MAX_PAGE_SIZE
+    adaptive_page_size = 'auto'
 
+    def paginate_queryset(self, queryset, request, view=None):
+        self.view = view
+        return super().paginate_queryset(queryset, request, view=view)
 
-class ActivityStreamDirectorySSOUsers(ListAPIView):
-    authentication_classes = [_ActivityStreamAuthentication]
-    permission_classes = [_XForwardForCheck]
+    def get_page_size(self, request):
+        if request.query_params.get(self.page_size_query_param) == self.adaptive_page_size and self.view is not None:
+            return get_adaptive_page_size(self.view.activity_type).get_page_size()
+        return super().get_page_size(request)
 
-    pagination_class = ActivityStreamDirectorySSOUsersPagination
-    queryset = User.objects.all()
-    serializer_class = serializers.ActivityStreamUsersSerializer
+
+class BulkExportMixin:
+    """Adds a bulk export mode to an activity stream feed.
+
+    `?export=ndjson` streams every row, or those after `position`, as
+    gzip-compressed NDJSON with one activity per line. Rows are read in
+    primary key order through a server-side cursor and compressed chunk by
+    chunk, so memory use stays flat however large the table. A
+    `{"position": ...}` line follows each chunk; passing the last one
+    received back as `position` resumes an interrupted export.
+    """
+
+    export_chunk_size = 2000
+    invalid_position_message = 'Invalid position'
 
     def get(self, request, *args, **kwargs):
-        queryset = self.filter_queryset(self.get_queryset())
+        if request.query_params.get('export') == 'ndjson':
+            return self.export(request)
+        return self.get_page(request)
+
+    def export(self, request):
+        queryset = self.get_queryset().order_by('id')
+        position = request.query_params.get('position')
+        if position is not None:
+            try:
+                queryset = queryset.filter(id__gt=int(position))
+            except ValueError:
+                raise NotFound(self.invalid_position_message)
+        response = StreamingHttpResponse(self.stream_export(queryset), content_type='application/x-ndjson')
+        response['Content-Encoding'] = 'gzip'
+        return response
 
-        queryset_page = self.paginate_queryset(queryset)
-        serializer = self.get_serializer(queryset_page, many=True)
+    def stream_export(self, queryset):
+        compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+        chunk = []
+        for row in queryset.iterator(chunk_size=self.export_chunk_size):
+            chunk.append(row)
+            if len(chunk) == self.export_chunk_size:
+                yield compressor.compress(self.render_export_chunk(chunk))
+                chunk = []
+        if chunk:
+            yield compressor.compress(self.render_export_chunk(chunk))
+        yield compressor.flush()
+
+    def render_export_chunk(self, rows):
+        lines = [json.dumps(item, separators=(',', ':')) for item in self.get_activities(rows)]
+        lines.append(json.dumps({'position': str(rows[-1]['id'])}))
+        return ('\n'.join(lines) + '\n').encode()
+
+
+class ActivityStreamFeed(BulkExportMixin, ActivityStreamAPIView):
+    """Activity stream feed of one model, declared by its activity type and field projection.
+
+    `fields` maps each property of the activity object, after the
+    `dit:DirectorySSO:<activity_type>:` prefix, to the values() lookup it is
+    read from. A page is a single values() query with the joins the lookups
+    need, paginated by (modified, id), so the model needs an index on those
+    fields for pages deep into the feed to stay cheap.
+
+    Rendered pages are cached per URL. A saved row gets the latest
+    `modified`, so it moves to the end of the feed as a new Update activity
+    and nothing new ever lands in a page that is followed by another one.
+    Such a page is cached under the feed's version, which only a deleted row
+    evicts. The last page is cached under the feed's high-water mark as well,
+    which moves whenever a row of the feed's model is saved (see
+    core.signals). Saving a related model, such as a user logging in, evicts
+    nothing: the values read through it are as of when the page was rendered,
+    for up to ACTIVITY_STREAM_PAGE_CACHE_SECONDS. A cache hit makes no
+    queries, and only the Hawk Server-Authorization header is computed for it.
+    """
 
-        page = {
-            '@context': [
-                'https://www.w3.org/ns/activitystreams',
-            ],
-            'type': 'Collection',
-            'orderedItems': [
-                {
-                    'dit:application': 'DirectorySSO',
-                    'id': f'dit:DirectorySSO:User:{user["id"]}:Update',
-                    'published': user["modified"],
-                    'type': 'Update',
-                    'object': {
-                        'id': f'dit:DirectorySSO:User:{user["id"]}',
-                        'type': 'dit:DirectorySSO:User',
-                        'dit:DirectorySSO:User:hashedUuid': user['hashed_uuid'],
-                        'dit:DirectorySSO:User:email': user['email'],
-                        'dit:DirectorySSO:User:telephone': user['telephone'],
-                        'dit:DirectorySSO:User:dateJoined': user['date_joined'],
-                        'dit:DirectorySSO:User:LastLogin': user['last_login'],
-                    },
-                }
-                for user in serializer.data
-            ],
-            'next': self.paginator.get_next_link(),
-            'previous': self.paginator.get_previous_link(),
-        }
+    pagination_class = ActivityStreamDirectorySSOUsersPagination
 
-        return Response(data=page)
+    model = None
+    activity_type = None
+    fields = {}
+    # lookups that are read to build the activity, but not projected into it
+    extra_values = ()
+
+    @classmethod
+    def get_version_key(cls):
+        return ACTIVITY_STREAM_FEED_VERSION_CACHE_KEY.format(activity_type=cls.activity_type)
+
+    @classmethod
+    def get_high_water_mark_key(cls):
+        return ACTIVITY_STREAM_FEED_HIGH_WATER_MARK_CACHE_KEY.format(activity_type=cls.activity_type)
+
+    def get_page_cache_keys(self, request):
+        """The cache keys of the page if it is followed by another one, and if it is the last one"""
+        version_key, high_water_mark_key = self.get_version_key(), self.get_high_water_mark_key()
+        versions = cache.get_many([version_key, high_water_mark_key])
+        version = versions.get(version_key) or get_version(version_key)
+        high_water_mark = versions.get(high_water_mark_key) or get_version(high_water_mark_key)
+        url_hash = hashlib.sha256(request.build_absolute_uri().encode()).hexdigest()
+        return (
+            ACTIVITY_STREAM_PAGE_CACHE_KEY.format(activity_type=self.activity_type, version=version, url_hash=url_hash),
+            ACTIVITY_STREAM_PAGE_CACHE_KEY.format(
+                activity_type=self.activity_type, version=f'{version}:{high_water_mark}', url_hash=url_hash
+            ),
+        )
 
+    def get_queryset(self):
+        return self.model.objects.values('id', 'modified', *self.fields.values(), *self.extra_values)
+
+    def get_activities(self, rows):
+        format_datetime = DateTimeField().to_representation
+
+        def format_value(value):
+            return format_datetime(value) if isinstance(value, datetime.datetime) else value
+
+        prefix = f'dit:DirectorySSO:{self.activity_type}'
+        return [
+            {
+                'dit:application': 'DirectorySSO',
+                'id': f'{prefix}:{row["id"]}:Update',
+                'published': format_datetime(row['modified']),
+                'type': 'Update',
+                'object': {
+                    'id': f'{prefix}:{row["id"]}',
+                    'type': prefix,
+                    **{f'{prefix}:{name}': format_value(row[lookup]) for name, lookup in self.fields.items()},
+                },
+            }
+            for row in rows
+        ]
+
+    def get_page(self, request):
+        closed_cache_key, last_cache_key = self.get_page_cache_keys(request)
+        cached = cache.get_many([closed_cache_key, last_cache_key])
+        content = cached.get(closed_cache_key, cached.get(last_cache_key))
+        if content is None:
+            started = time.perf_counter()
+            queryset_page = self.paginate_queryset(self.filter_queryset(self.get_queryset()))
+            page = {
+                '@context': [
+                    'https://www.w3.org/ns/activitystreams',
+                ],
+                'type': 'Collection',
+                'orderedItems': self.get_activities(queryset_page),
+                'next': self.paginator.get_next_link(),
+                'previous': self.paginator.get_previous_link(),
+            }
+            content = JSONRenderer().render(page)
+            get_adaptive_page_size(self.activity_type).record(len(queryset_page), time.perf_counter() - started)
+            cache_key = closed_cache_key if self.paginator.has_next else last_cache_key
+            cache.set(cache_key, content, settings.ACTIVITY_STREAM_PAGE_CACHE_SECONDS)
+        response = HttpResponse(content, content_type='application/json')
+        response['Server-Authorization'] = request.auth.respond(content=content, content_type='application/json')
+        return response
 
-class ActivityStreamDirectorySSOUserAnswersVFM(ListAPIView):
-    authentication_classes = [_ActivityStreamAuthentication]
-    permission_classes = [_XForwardForCheck]
 
-    pagination_class = ActivityStreamDirectorySSOUsersPagination
-    queryset = UserAnswer.objects.all()
-    serializer_class = serializers.ActivityStreamUserAnswerSerializer
+class ActivityStreamDirectorySSOUsers(ActivityStreamFeed):
+    model = User
+    activity_type = 'User'
+    fields = {
+        'hashedUuid': 'hashed_uuid',
+        'email': 'email',
+        'telephone': 'user_profile__mobile_phone_number',
+        'dateJoined': 'date_joined',
+        'LastLogin': 'last_login',
+    }
+
+
+class ActivityStreamDirectorySSOUserAnswersVFM(ActivityStreamFeed):
+    model = UserAnswer
+    activity_type = 'UserAnswer'
+    fields = {
+        'user:id': 'user_id',
+        'user:hashed_uuid': 'user__hashed_uuid',
+        'answer': 'answer',
+        'question:id': 'question_id',
+        'question:title': 'question__title',
+    }
+    extra_values = ('question__question_type', 'question__question_choices', 'question__predefined_choices')
+
+    def get_activities(self, rows):
+        items = super().get_activities(rows)
+        choice_labels = {}
+        for row, item in zip(rows, items):
+            question_id = row['question_id']
+            if question_id not in choice_labels:
+                question = Question(
+                    pk=question_id,
+                    question_choices=row['question__question_choices'],
+                    predefined_choices=row['question__predefined_choices'],
+                )
+                choice_labels[question_id] = question.get_choice_labels()
+            item['object']['dit:DirectorySSO:UserAnswer:answer_label'] = get_answer_label(
+                row['question__question_type'], row['answer'], choice_labels[question_id]
+            )
+        return items
+
+
+class ActivityStreamDirectorySSOUserPageViews(ActivityStreamFeed):
+    model = UserPageView
+    activity_type = 'UserPageView'
+    fields = {
+        'user:id': 'user_id',
+        'user:hashed_uuid': 'user__hashed_uuid',
+        'service': 'service_page__service__name',
+        'page': 'service_page__page_name',
+        'created': 'created',
+    }
+
+
+class ActivityStreamDirectorySSOLessonsCompleted(ActivityStreamFeed):
+    model = LessonCompleted
+    activity_type = 'LessonCompleted'
+    fields = {
+        'user:id': 'user_id',
+        'user:hashed_uuid': 'user__hashed_uuid',
+        'service': 'service__name',
+        'lesson_page': 'lesson_page',
+        'lesson': 'lesson',
+        'module': 'module',
+        'created': 'created',
+    }
+
+
+class ActivityStreamDirectorySSOUserData(ActivityStreamFeed):
+    model = UserData
+    activity_type = 'UserData'
+    fields = {
+        'user:id': 'user_id',
+        'user:hashed_uuid': 'user__hashed_uuid',
+        'name': 'name',
+        'data': 'data',
+    }
 
-    def get(self, request, *args, **kwargs):
-        queryset = self.filter_queryset(self.get_queryset())
 
-        queryset_page = self.paginate_queryset(queryset)
-        serializer = self.get_serializer(queryset_page, many=True)
+class ActivityStreamDirectorySSOUserProfiles(ActivityStreamFeed):
+    model = UserProfile
+    activity_type = 'UserProfile'
+    fields = {
+        'user:id': 'user_id',
+        'user:hashed_uuid': 'user__hashed_uuid',
+        'first_name': 'first_name',
+        'last_name': 'last_name',
+        'job_title': 'job_title',
+        'mobile_phone_number': 'mobile_phone_number',
+        'segment': 'segment',
+    }
+
+
+class ActivityStreamOutboxPagination(BasePagination):
+    """Keyset pagination over the outbox by (transaction_id, id).
+
+    Only events written by transactions that finished before the oldest one
+    still running are served. An event that commits later therefore always
+    sorts after every cursor already handed out, and is never skipped.
+
+    The oldest running transaction is the snapshot xmin of the whole
+    database, not just of transactions that write events. The feed therefore
+    serves nothing newer than any transaction that is still open, whatever
+    it is doing, until that transaction ends. Jobs that change many rows
+    commit in short batches (see obsfucate_personal_details and
+    prune_outbox_events) rather than in one transaction, so they hold the
+    feed back only briefly.
+    """
+
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+    page_size = api_settings.PAGE_SIZE
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        # stalls while any transaction in the database stays open, see above
+        queryset = queryset.filter(transaction_id__lt=RawSQL('txid_snapshot_xmin(txid_current_snapshot())', []))
+        position = self.decode_cursor(request)
+        if position:
+            transaction_id, pk = position
+            queryset = queryset.filter(transaction_id__gte=transaction_id).exclude(
+                transaction_id=transaction_id, id__lte=pk
+            )
+        self.page = list(queryset.order_by('transaction_id', 'id')[: self.page_size])
+        return self.page
+
+    def decode_cursor(self, request):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor is None:
+            return None
+        try:
+            transaction_id, pk = cursor.split('.')
+            return int(transaction_id), int(pk)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_next_link(self):
+        if len(self.page) < self.page_size:
+            return None
+        last = self.page[-1]
+        cursor = f'{last["transaction_id"]}.{last["id"]}'
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, cursor)
+
+
+def get_outbox_activities(rows):
+    """Build the outbox feed items from OutboxEvent.objects.values() rows"""
+    format_datetime = DateTimeField().to_representation
+    return [
+        {
+            'dit:application': 'DirectorySSO',
+            'id': f'dit:DirectorySSO:OutboxEvent:{row["id"]}',
+            'published': format_datetime(row['created']),
+            'type': row['action'],
+            'object': {
+                'id': f'dit:DirectorySSO:{row["model"]}:{row["object_id"]}',
+                'type': f'dit:DirectorySSO:{row["model"]}',
+                f'dit:DirectorySSO:{row["model"]}:user:id': row['user_id'],
+                **{f'dit:DirectorySSO:{row["model"]}:{field}': value for field, value in row['data'].items()},
+            },
+        }
+        for row in rows
+    ]
+
+
+class ActivityStreamDirectorySSOOutbox(ActivityStreamAPIView):
+    """Changes to users and their data, including deletes, in the order they were committed"""
+
+    pagination_class = ActivityStreamOutboxPagination
+    queryset = OutboxEvent.objects.values(
+        'id', 'transaction_id', 'created', 'action', 'model', 'object_id', 'user_id', 'data'
+    )
+
+    def get(self, request, *args, **kwargs):
+        queryset_page = self.paginate_queryset(self.get_queryset())
         page = {
             '@context': [
                 'https://www.w3.org/ns/activitystreams',
             ],
             'type': 'Collection',
-            'orderedItems': [
-                {
-                    'dit:application': 'DirectorySSO',
-                    'id': f'dit:DirectorySSO:UserAnswer:{user_answer["id"]}:Update',
-                    'published': user_answer["modified"],
-                    'type': 'Update',
-                    'object': {
-                        'id': f'dit:DirectorySSO:UserAnswer:{user_answer["id"]}',
-                        'type': 'dit:DirectorySSO:UserAnswer',
-                        'dit:DirectorySSO:UserAnswer:user:id': user_answer["user_id"],
-                        'dit:DirectorySSO:UserAnswer:user:hashed_uuid': user_answer["hashed_uuid"],
-                        'dit:DirectorySSO:UserAnswer:answer': user_answer["answer"],
-                        'dit:DirectorySSO:UserAnswer:question:id': user_answer["question_id"],
-                        'dit:DirectorySSO:UserAnswer:question:title': user_answer["question_title"],
-                        'dit:DirectorySSO:UserAnswer:answer_label': user_answer["answer_label"],
-                    },
-                }
-                for user_answer in serializer.data
-            ],
+            'orderedItems': get_outbox_activities(queryset_page),
             'next': self.paginator.get_next_link(),
-            'previous': self.paginator.get_previous_link(),
         }
         return Response(data=page)
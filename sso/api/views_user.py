@@ -1,29 +1,28 @@
-from django.contrib.sessions.models import Session
 from django.core.exceptions import ValidationError
-from django.utils import timezone
+from django.http import Http404
 from django_filters.views import FilterMixin
 from rest_framework import status
-from rest_framework.generics import ListAPIView, RetrieveAPIView, get_object_or_404
+from rest_framework.generics import ListAPIView, RetrieveAPIView
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from conf.signature import SignatureCheckPermission
+from core.authentication import get_session_user, get_session_users
+from core.cache_invalidation import USER_PAGE_CACHE_VERSION_KEY
+from core.mixins import ConditionalUserRetrieveMixin
 from sso.api import filters
 from sso.user import models, serializers
 
 
 class GetUserBySessionKeyMixin:
-    def get_session_queryset(self):
-        return Session.objects.filter(expire_date__gt=timezone.now())
-
     def get_session_key_user(self, session_key):
-        queryset = self.get_session_queryset()
-        session = get_object_or_404(queryset, session_key=session_key)
-        user_id = session.get_decoded().get('_auth_user_id')
-        return get_object_or_404(models.User.objects.select_related('user_profile'), pk=user_id)
+        user = get_session_user(session_key)
+        if user is None:
+            raise Http404
+        return user
 
 
-class SessionUserAPIView(GetUserBySessionKeyMixin, RetrieveAPIView):
+class SessionUserAPIView(ConditionalUserRetrieveMixin, GetUserBySessionKeyMixin, RetrieveAPIView):
     permission_classes = [SignatureCheckPermission]
     authentication_classes = []
     serializer_class = serializers.UserSerializer
@@ -34,6 +33,23 @@ class SessionUserAPIView(GetUserBySessionKeyMixin, RetrieveAPIView):
         return self.get_session_key_user(session_key)
 
 
+class SessionUserBatchAPIView(APIView):
+    """Resolve many session keys in one request. Unresolved keys map to null."""
+
+    permission_classes = [SignatureCheckPermission]
+    authentication_classes = []
+    serializer_class = serializers.SessionKeysSerializer
+
+    def post(self, request, format=None):
+        serializer = self.serializer_class(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        session_keys = serializer.validated_data['session_keys']
+        users = get_session_users(session_keys)
+        data = serializers.UserSerializer(users.values(), many=True).data
+        users_data = dict(zip(users.keys(), data))
+        return Response({session_key: users_data.get(session_key) for session_key in session_keys})
+
+
 class LastLoginAPIView(FilterMixin, ListAPIView):
     authentication_classes = []
     filterset_class = filters.LastLoginFilter
@@ -41,6 +57,7 @@ class LastLoginAPIView(FilterMixin, ListAPIView):
     queryset = models.User.objects.exclude(last_login__isnull=True)
     serializer_class = serializers.LastLoginSerializer
     strict = True
+    page_cache_version_key = USER_PAGE_CACHE_VERSION_KEY
 
     def handle_exception(self, exception):
         if isinstance(exception, ValidationError):
@@ -0,0 +1,85 @@
+import time
+import tracemalloc
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from sso.api.views_activity_stream import ActivityStreamDirectorySSOUserAnswersVFM, ActivityStreamDirectorySSOUsers
+from sso.user.models import Question, Service, User, UserAnswer, UserProfile
+
+ORDERING = ('modified', 'id')
+
+
+class Command(BaseCommand):
+    """
+    Measure the throughput and peak memory of building activity stream pages
+    from values() rows. The benchmark data is created in a transaction that is
+    rolled back, but as it writes to the database the command only runs with
+    DEBUG on or when --force is passed.
+    """
+
+    help = 'Benchmarks building activity stream pages.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000, help='Number of rows in the benchmarked page.')
+        parser.add_argument(
+            '--force', action='store_true', help='Run without DEBUG, writing the benchmark data to the database.'
+        )
+
+    def handle(self, *args, **options):
+        if not settings.DEBUG and not options['force']:
+            self.stdout.write(
+                self.style.WARNING('Writes benchmark data to the database, pass --force to run - exiting')
+            )
+            return
+
+        rows = options['rows']
+        with transaction.atomic():
+            create_benchmark_data(rows)
+            for feed, view_class in (
+                ('users', ActivityStreamDirectorySSOUsers),
+                ('user-answers-vfm', ActivityStreamDirectorySSOUserAnswersVFM),
+            ):
+                count, elapsed, peak = measure(lambda: build_page(view_class, rows))
+                self.stdout.write(
+                    f'{feed}: {count} rows, {count / elapsed:.0f} rows/sec, peak {peak / 1024 / 1024:.1f}MB'
+                )
+            transaction.set_rollback(True)
+
+
+def create_benchmark_data(rows):
+    users = User.objects.bulk_create(
+        User(email=f'benchmark-{i}@example.com', hashed_uuid=f'benchmark-{i}') for i in range(rows)
+    )
+    UserProfile.objects.bulk_create(UserProfile(user=user, mobile_phone_number='0123456789') for user in users)
+    service = Service.objects.create(name='benchmark')
+    questions = [
+        Question.objects.create(service=service, name='radio', title='Radio', question_type='RADIO'),
+        Question.objects.create(
+            service=service,
+            name='multi-select',
+            title='Multi select',
+            question_type='MULTI_SELECT',
+            predefined_choices='SECTORS',
+        ),
+    ]
+    UserAnswer.objects.bulk_create(
+        UserAnswer(user=user, question=questions[i % 2], answer=['AEROSPACE', 'AUTOMOTIVE'] if i % 2 else 'yes')
+        for i, user in enumerate(users)
+    )
+
+
+def build_page(view_class, rows):
+    view = view_class()
+    return view.get_activities(list(view.get_queryset().order_by(*ORDERING)[:rows]))
+
+
+def measure(build_page):
+    tracemalloc.start()
+    started = time.perf_counter()
+    items = build_page()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return len(items), elapsed, peak
@@ -2,8 +2,9 @@ import argparse
 
 from django.conf import settings
 from django.core.management import BaseCommand
+from django.db import transaction
 
-from sso.user.models import User, UserProfile
+from sso.user.models import OutboxEvent, User, UserProfile
 
 
 class Command(BaseCommand):
@@ -12,6 +13,7 @@ class Command(BaseCommand):
     START_INDEX = 1
     END_INDEX = -1
     MASK_CHAR = '*'
+    BATCH_SIZE = 500
 
     count = 0
 
@@ -62,6 +64,16 @@ class Command(BaseCommand):
         if options['dry_run'] is False:
             user_profile.save()
 
+    def get_batches(self, queryset):
+        """Yields the primary keys of `queryset` in batches of BATCH_SIZE"""
+        last_pk = 0
+        while True:
+            pks = list(queryset.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[: self.BATCH_SIZE])
+            if not pks:
+                return
+            yield pks
+            last_pk = pks[-1]
+
     def add_arguments(self, parser):
         parser.add_argument(
             '--dry_run',
@@ -76,13 +88,24 @@ class Command(BaseCommand):
             self.stdout.write(self.style.WARNING('Running in Production environment is disabled - exiting'))
             return
 
+        # Redact the unmasked details recorded in the outbox
+        if options['dry_run'] is False:
+            for pks in self.get_batches(OutboxEvent.objects.exclude(data={})):
+                OutboxEvent.objects.filter(pk__in=pks).update(data={})
+
         # Obsfucate User Data
-        for user in User.objects.all():
-            self.mask_user(user, options)
+        for pks in self.get_batches(User.objects.all()):
+            # one short transaction per batch, which sends the batch's cache invalidations together without holding
+            # back the outbox feed for the whole job (see ActivityStreamOutboxPagination)
+            with transaction.atomic():
+                for user in User.objects.filter(pk__in=pks):
+                    self.mask_user(user, options)
 
         # Obsfucate UserProfile  Data
-        for user_profile in UserProfile.objects.all():
-            self.mask_user_profile(user_profile, options)
+        for pks in self.get_batches(UserProfile.objects.all()):
+            with transaction.atomic():
+                for user_profile in UserProfile.objects.filter(pk__in=pks):
+                    self.mask_user_profile(user_profile, options)
 
         if options['dry_run'] is True:
             self.stdout.write(self.style.WARNING('Dry run -- no data updated.'))
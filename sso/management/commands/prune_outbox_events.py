@@ -0,0 +1,26 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management import BaseCommand
+from django.utils import timezone
+
+from sso.user.models import OutboxEvent
+
+
+class Command(BaseCommand):
+    help = 'Delete outbox events older than OUTBOX_RETENTION_DAYS'
+
+    BATCH_SIZE = 1000
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=settings.OUTBOX_RETENTION_DAYS)
+        queryset = OutboxEvent.objects.filter(created__lt=cutoff).order_by('pk')
+        total = 0
+        # a batch at a time, as a long transaction holds back the outbox feed (see ActivityStreamOutboxPagination)
+        while True:
+            pks = list(queryset.values_list('pk', flat=True)[: self.BATCH_SIZE])
+            if not pks:
+                break
+            OutboxEvent.objects.filter(pk__in=pks).delete()
+            total += len(pks)
+        self.stdout.write(self.style.SUCCESS(f'Deleted {total} outbox events'))
@@ -1,6 +1,7 @@
 import datetime
 
 import pytest
+from allauth.socialaccount.models import SocialAccount
 from django.urls import reverse
 from django.utils import timezone
 from oauth2_provider.models import AccessToken, Application
@@ -53,6 +54,39 @@ def test_user_retrieve_view_authorised():
     assert response.data['user_profile']['last_name'] == user_profile.last_name
 
 
+@pytest.mark.django_db
+def test_user_retrieve_view_num_queries(django_assert_num_queries):
+    _, _, user, user_profile, access_token = setup_data()
+    SocialAccount.objects.create(user=user, provider='google', uid='1', extra_data={'picture': 'a.png'})
+
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION='Bearer {}'.format(access_token.token))
+
+    # access token and user, profile, social accounts
+    with django_assert_num_queries(3):
+        response = client.get(reverse('oauth2_provider:user-profile'))
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data['social_login'] is True
+    assert response.data['user_profile']['profile_image'] == 'a.png'
+
+
+@pytest.mark.django_db
+def test_user_retrieve_view_not_modified():
+    _, _, user, user_profile, access_token = setup_data()
+
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION='Bearer {}'.format(access_token.token))
+
+    etag = client.get(reverse('oauth2_provider:user-profile'))['ETag']
+    response = client.get(reverse('oauth2_provider:user-profile'), HTTP_IF_NONE_MATCH=etag)
+
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+    assert 'private' in response['Cache-Control']
+    assert response['ETag'] == etag
+    assert 'Authorization' in response['Vary']
+
+
 @pytest.mark.django_db
 def test_user_retrieve_view_no_token():
     setup_data()
@@ -7,7 +7,7 @@ import core.mixins
 from sso.user.serializers import UserSerializer
 
 
-class UserRetrieveAPIView(core.mixins.NoIndexMixin, RetrieveAPIView):
+class UserRetrieveAPIView(core.mixins.NoIndexMixin, core.mixins.ConditionalUserRetrieveMixin, RetrieveAPIView):
     permission_classes = [permissions.IsAuthenticated, TokenHasScope]
     required_scopes = ['profile']
     serializer_class = UserSerializer
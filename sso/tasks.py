@@ -1,3 +1,8 @@
+from smtplib import SMTPException
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.mail import send_mail
 from django.core.management import call_command
 
 from conf.celery import app
@@ -16,3 +21,34 @@ def archive_users():
 @app.task()
 def obsfucate_personal_details():
     call_command('obsfucate_personal_details')
+
+
+@app.task()
+def prune_outbox_events():
+    call_command('prune_outbox_events')
+
+
+@app.task(autoretry_for=(SMTPException, TimeoutError))
+def notify_suspicious_login_activity(email, attempts):
+    send_mail(
+        subject='Suspicious activity on SSO',
+        message=f'{email} tried to login {attempts} times',
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        recipient_list=[settings.SSO_SUSPICIOUS_ACTIVITY_NOTIFICATION_EMAIL],
+    )
+
+
+@app.task()
+def upgrade_password_hash(user_id, password):
+    # imported here as sso.user.models imports this module
+    from core.authentication import evict_session_user
+    from sso.user.hashing import is_hash_outdated
+
+    users = get_user_model().objects.filter(pk=user_id)
+    current_password = users.values_list('password', flat=True).first()
+    # a password changed since the login is hashed with the preferred hasher already, so is left alone
+    if current_password is None or not is_hash_outdated(current_password):
+        return
+    # compare-and-swap, in case the password changes between the read and the write
+    if users.filter(password=current_password).update(password=password):
+        evict_session_user(user_id)
@@ -10,6 +10,7 @@ from rest_framework.response import Response
 
 import core.mixins
 from conf.signature import SignatureCheckPermission
+from core.cache_invalidation import USER_PAGE_CACHE_VERSION_KEY
 from sso.user import models
 
 
@@ -19,6 +20,7 @@ class UserByEmailAPIView(core.mixins.NoIndexMixin, RetrieveAPIView, DestroyAPIVi
     queryset = models.User.objects.all()
     lookup_field = 'email'
     http_method_names = ('get', 'delete', 'patch')
+    page_cache_version_key = USER_PAGE_CACHE_VERSION_KEY
 
     def dispatch(self, *args, **kwargs):
         if not settings.FEATURE_FLAGS['TEST_API_ON']:
@@ -0,0 +1,29 @@
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+
+from sso.user.models import User
+
+
+@pytest.mark.django_db
+def test_benchmark_activity_stream():
+    out = StringIO()
+
+    call_command('benchmark_activity_stream', '--rows=10', '--force', stdout=out)
+
+    lines = out.getvalue().splitlines()
+    assert [line.split(':')[0] for line in lines] == ['users', 'user-answers-vfm']
+    assert all(' 10 rows, ' in line for line in lines)
+    assert User.objects.count() == 0
+
+
+@pytest.mark.django_db
+def test_benchmark_activity_stream_needs_debug_or_force(settings):
+    settings.DEBUG = False
+    out = StringIO()
+
+    call_command('benchmark_activity_stream', '--rows=10', stdout=out)
+
+    assert 'pass --force' in out.getvalue()
+    assert User.objects.count() == 0
@@ -0,0 +1,23 @@
+from datetime import datetime, timedelta
+from unittest import mock
+
+import pytest
+from django.core.management import call_command
+from freezegun import freeze_time
+
+from sso.management.commands.prune_outbox_events import Command
+from sso.user.models import OutboxEvent
+from sso.user.tests.factories import UserFactory
+
+
+@pytest.mark.django_db
+@mock.patch.object(Command, 'BATCH_SIZE', 2)
+def test_prune_outbox_events(settings):
+    settings.OUTBOX_RETENTION_DAYS = 30
+    with freeze_time(datetime.now() - timedelta(days=31)):
+        UserFactory.create_batch(3)
+    recent = UserFactory()
+
+    call_command('prune_outbox_events')
+
+    assert list(OutboxEvent.objects.values_list('object_id', flat=True)) == [recent.pk]
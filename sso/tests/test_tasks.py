@@ -1,6 +1,8 @@
 from unittest import mock
 
 import pytest
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
 from django.test.utils import override_settings
 
 from sso import tasks
@@ -25,6 +27,12 @@ def test_archive_users_task(mocked_call_command):
     mocked_call_command.assert_called_once()
 
 
+@mock.patch('sso.tasks.call_command')
+def test_prune_outbox_events_task(mocked_call_command):
+    tasks.prune_outbox_events()
+    mocked_call_command.assert_called_once_with('prune_outbox_events')
+
+
 @override_settings(APP_ENVIRONMENT='dev')
 @mock.patch('sso.management.commands.obsfucate_personal_details.Command.mask_user_profile')
 @mock.patch('sso.management.commands.obsfucate_personal_details.Command.mask_user')
@@ -47,3 +55,79 @@ def test_obsfucate_personal_details_prod_env(mock_mask_user, mock_mask_user_prof
     tasks.obsfucate_personal_details()
     assert mock_mask_user.call_count == 0
     assert mock_mask_user_profile.call_count == 0
+
+
+@mock.patch('sso.tasks.send_mail')
+def test_notify_suspicious_login_activity_task(mock_send_mail, settings):
+    settings.SSO_SUSPICIOUS_ACTIVITY_NOTIFICATION_EMAIL = 'foo@bar.com'
+
+    tasks.notify_suspicious_login_activity('foo@bar.com', 10)
+
+    assert mock_send_mail.call_count == 1
+    assert mock_send_mail.call_args == mock.call(
+        from_email='debug',
+        message='foo@bar.com tried to login 10 times',
+        recipient_list=['foo@bar.com'],
+        subject='Suspicious activity on SSO',
+    )
+
+
+@pytest.mark.django_db
+@mock.patch('core.authentication.evict_session_user')
+def test_upgrade_password_hash_task(mock_evict_session_user):
+    user = UserFactory(password=make_password('password', hasher='pbkdf2_sha1'))
+    upgraded_password = make_password('password')
+
+    tasks.upgrade_password_hash(user.pk, upgraded_password)
+
+    user.refresh_from_db()
+    assert user.password == upgraded_password
+    mock_evict_session_user.assert_called_once_with(user.pk)
+
+
+@pytest.mark.django_db
+@mock.patch('core.authentication.evict_session_user')
+def test_upgrade_password_hash_task_password_changed(mock_evict_session_user):
+    changed_password = make_password('changed')
+    user = UserFactory(password=changed_password)
+
+    tasks.upgrade_password_hash(user.pk, make_password('password'))
+
+    user.refresh_from_db()
+    assert user.password == changed_password
+    assert mock_evict_session_user.call_count == 0
+
+
+@pytest.mark.django_db
+def test_upgrade_password_hash_task_password_changed_concurrently():
+    user = UserFactory(password=make_password('password', hasher='pbkdf2_sha1'))
+    changed_password = make_password('changed')
+
+    def change_password(encoded):
+        # the password is changed between the task reading the hash and writing the new one
+        type(user).objects.filter(pk=user.pk).update(password=changed_password)
+        return True
+
+    with mock.patch('sso.user.hashing.is_hash_outdated', side_effect=change_password):
+        tasks.upgrade_password_hash(user.pk, make_password('password'))
+
+    user.refresh_from_db()
+    assert user.password == changed_password
+
+
+@override_settings(APP_ENVIRONMENT='dev')
+@mock.patch('sso.management.commands.obsfucate_personal_details.Command.BATCH_SIZE', 2)
+@pytest.mark.django_db
+def test_obsfucate_personal_details_in_batches():
+    users = [UserFactory(email=f'jim{i}@example.com') for i in range(3)]
+
+    with mock.patch(
+        'sso.management.commands.obsfucate_personal_details.transaction', wraps=transaction
+    ) as mock_transaction:
+        tasks.obsfucate_personal_details()
+
+    # two batches of users, and none of profiles
+    assert mock_transaction.atomic.call_count == 2
+    for i, user in enumerate(users):
+        user.refresh_from_db()
+        assert user.email.startswith(f'j**{i}-')
@@ -1,5 +1,6 @@
 from django.apps import AppConfig
-from django.db.models.signals import pre_save
+from django.contrib.auth.signals import user_logged_in
+from django.db.models.signals import post_delete, post_save, pre_save
 
 
 class UserConfig(AppConfig):
@@ -9,3 +10,8 @@ class UserConfig(AppConfig):
         from sso.user import signals
 
         pre_save.connect(receiver=signals.create_uuid, sender='user.User')
+        user_logged_in.disconnect(dispatch_uid='update_last_login')
+        user_logged_in.connect(receiver=signals.update_last_login, dispatch_uid='update_last_login')
+        for model_label in signals.OUTBOX_FIELDS:
+            post_save.connect(receiver=signals.record_outbox_save, sender=model_label)
+            post_delete.connect(receiver=signals.record_outbox_delete, sender=model_label)
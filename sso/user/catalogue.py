@@ -0,0 +1,96 @@
+from types import MappingProxyType
+
+from django.core.cache import cache
+
+from core.cache_invalidation import get_version
+from core.local_cache import LocalLRUCache
+from sso.user.models import Question, Service, ServicePage
+
+# ids are kept under this version, which a change to any service or page retires in every process
+CATALOGUE_VERSION_CACHE_KEY = 'sso:catalogue-version'
+SERVICE_ID_CACHE_KEY = 'sso:catalogue:service:{name}'
+SERVICE_PAGE_ID_CACHE_KEY = 'sso:catalogue:service-page:{service_id}:{page_name}'
+# replaced whenever a question of the service changes, so questionnaires rendered for an older version are not reused
+QUESTIONNAIRE_VERSION_CACHE_KEY = 'sso:questionnaire-version:{service_id}'
+QUESTIONNAIRE_CACHE_KEY = 'sso:catalogue:questionnaire:{service_id}:{version}'
+# retired by a new version when a service or page changes, so this only bounds a race with a concurrent write
+CATALOGUE_CACHE_SECONDS = 60 * 60 * 24
+LOCAL_CATALOGUE_MAX_SIZE = 1024
+
+local_catalogue = LocalLRUCache(max_size=LOCAL_CATALOGUE_MAX_SIZE)
+
+
+def get_id(cache_key, load):
+    # the version is read from the shared cache on every call, so a change made in another process is seen at once
+    versioned_cache_key = f'{cache_key}:{get_version(CATALOGUE_VERSION_CACHE_KEY)}'
+    object_id = local_catalogue.get(versioned_cache_key)
+    if object_id is None:
+        object_id = cache.get(versioned_cache_key)
+        if object_id is None:
+            object_id = load()
+            cache.set(versioned_cache_key, object_id, CATALOGUE_CACHE_SECONDS)
+        local_catalogue.set(versioned_cache_key, object_id, CATALOGUE_CACHE_SECONDS)
+    return object_id
+
+
+def get_service(name, create=False):
+    """The service called `name`, with only its id and name loaded.
+
+    Services and their pages almost never change, so their ids are kept in
+    this process and in the shared cache, under the catalogue's version,
+    rather than looked up by name on every request. Raises Service.DoesNotExist if there is no such service,
+    unless `create` is set.
+    """
+
+    def load():
+        if create:
+            return Service.objects.get_or_create(name=name)[0].pk
+        return Service.objects.values_list('pk', flat=True).get(name=name)
+
+    return Service(pk=get_id(SERVICE_ID_CACHE_KEY.format(name=name), load), name=name)
+
+
+def get_service_page(service, page_name, create=False):
+    """The page of `service` called `page_name`, with only its id, service and name loaded.
+
+    Raises ServicePage.DoesNotExist if there is no such page, unless `create`
+    is set.
+    """
+
+    def load():
+        if create:
+            return ServicePage.objects.get_or_create(service_id=service.pk, page_name=page_name)[0].pk
+        return ServicePage.objects.values_list('pk', flat=True).get(service_id=service.pk, page_name=page_name)
+
+    cache_key = SERVICE_PAGE_ID_CACHE_KEY.format(service_id=service.pk, page_name=page_name)
+    return ServicePage(pk=get_id(cache_key, load), service=service, page_name=page_name)
+
+
+def get_questions(service):
+    """The active questions of `service` rendered by Question.to_dict(), as a read-only structure.
+
+    The rendering is kept in this process under the version of the service's
+    questions, which a change to any of them replaces (see core.signals), so
+    it is shared by every request and rebuilt only after a change.
+    """
+    version = get_version(QUESTIONNAIRE_VERSION_CACHE_KEY.format(service_id=service.pk))
+    cache_key = QUESTIONNAIRE_CACHE_KEY.format(service_id=service.pk, version=version)
+    questions = local_catalogue.get(cache_key)
+    if questions is None:
+        questions = freeze(
+            [question.to_dict() for question in Question.objects.filter(service_id=service.pk, is_active=True)]
+        )
+        local_catalogue.set(cache_key, questions, CATALOGUE_CACHE_SECONDS)
+    return questions
+
+
+def freeze(value):
+    if isinstance(value, dict):
+        return MappingProxyType({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+def clear_local_catalogue(**kwargs):
+    local_catalogue.clear()
@@ -0,0 +1,14 @@
+from django.conf import settings
+from django.contrib.auth import hashers
+
+
+class PBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    """PBKDF2 with an iteration count tuned for our hosts.
+
+    Run the calibrate_password_hashers management command to find the count
+    that meets the latency budget. Existing hashes are upgraded as users log in.
+    """
+
+    @property
+    def iterations(self):
+        return settings.PASSWORD_HASHING_PBKDF2_ITERATIONS or super().iterations
@@ -0,0 +1,150 @@
+import contextlib
+import functools
+import logging
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import sentry_sdk
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, get_hasher, identify_hasher, make_password
+from django.core.cache import cache
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+
+logger = logging.getLogger(__name__)
+
+PASSWORD_HASHING_SLOTS_CACHE_KEY = 'sso:password-hashing-slots:{host}'
+
+
+class PasswordHashingUnavailable(Exception):
+    """Raised when every password hashing slot on the node is taken."""
+
+
+class PasswordHashingLimiter:
+    """Caps how many password hashes the web workers on a node compute at once.
+
+    The web processes run gunicorn's sync workers, so each one serves a single
+    request at a time and a hash keeps its worker busy until it is done. The
+    slots are therefore shared by every worker on the node, as members of a
+    Redis sorted set keyed by host name. A request that finds them all taken
+    is answered with a 503 straight away rather than holding its worker while
+    it waits, so at most `max_concurrency` workers per node are hashing and
+    the others stay free for cheap requests such as /api/v1/session-user/.
+    The slot of a worker that dies mid-hash expires after `slot_timeout`
+    seconds.
+    """
+
+    def __init__(self, max_concurrency, slot_timeout, host=None):
+        self.max_concurrency = max_concurrency
+        self.slot_timeout = slot_timeout
+        self.cache_key = cache.make_key(PASSWORD_HASHING_SLOTS_CACHE_KEY.format(host=host or socket.gethostname()))
+        self._upgrade_executor = None
+        self._upgrade_pending = threading.BoundedSemaphore(1)
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Take a slot, returning its token, or raise PasswordHashingUnavailable."""
+        token = uuid.uuid4().hex
+        now = time.time()
+        try:
+            pipeline = get_redis_connection('default').pipeline()
+            pipeline.zremrangebyscore(self.cache_key, '-inf', now - self.slot_timeout)
+            pipeline.zadd(self.cache_key, {token: now})
+            pipeline.expire(self.cache_key, self.slot_timeout)
+            pipeline.zrank(self.cache_key, token)
+            rank = pipeline.execute()[-1]
+        except RedisError:
+            # hashing without a slot beats refusing every login while Redis is unavailable
+            logger.exception('Password hashing slots are unavailable')
+            return None
+        if rank >= self.max_concurrency:
+            self.release(token)
+            raise PasswordHashingUnavailable()
+        return token
+
+    def release(self, token):
+        if token is None:
+            return
+        try:
+            get_redis_connection('default').zrem(self.cache_key, token)
+        except RedisError:
+            logger.exception('Password hashing slot was not released')
+
+    @contextlib.contextmanager
+    def slot(self):
+        token = self.acquire()
+        try:
+            yield
+        finally:
+            self.release(token)
+
+    def verify(self, raw_password, encoded):
+        """Return whether the password matches and whether its hash should be upgraded."""
+        with sentry_sdk.start_span(op='auth.password_hash') as span:
+            requested = time.perf_counter()
+            with self.slot():
+                started = time.perf_counter()
+                # the setter is only called for a correct password whose hash is out of date
+                outdated = []
+                is_correct = check_password(raw_password, encoded, setter=outdated.append)
+                span.set_data('slot_wait_ms', round((started - requested) * 1000, 2))
+                span.set_data('hash_ms', round((time.perf_counter() - started) * 1000, 2))
+        return is_correct, bool(outdated)
+
+    @property
+    def upgrade_executor(self):
+        # created on first use so that it starts in the worker process rather than the gunicorn master
+        with self._lock:
+            if self._upgrade_executor is None:
+                self._upgrade_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='password-hash-upgrade')
+        return self._upgrade_executor
+
+    def upgrade_later(self, raw_password, callback):
+        """Hash the password with the preferred hasher on a background thread and pass the result to `callback`.
+
+        The hash takes one of the node's hashing slots like any other, and the
+        upgrade is dropped when they are all taken rather than waiting for one.
+        Each process runs one upgrade at a time and skips any other while it is
+        pending. The outdated hash still works, so a skipped upgrade is simply
+        retried at the next login. Returns the future, or None when skipped.
+        """
+        if not self._upgrade_pending.acquire(blocking=False):
+            return None
+        future = self.upgrade_executor.submit(self._upgrade, raw_password, callback)
+        future.add_done_callback(self._upgrade_done)
+        return future
+
+    def _upgrade(self, raw_password, callback):
+        try:
+            with self.slot():
+                password = make_password(raw_password)
+        except PasswordHashingUnavailable:
+            return
+        callback(password)
+
+    def _upgrade_done(self, future):
+        self._upgrade_pending.release()
+        if future.exception() is not None:
+            logger.error('Password hash upgrade failed', exc_info=future.exception())
+
+
+def is_hash_outdated(encoded):
+    """Return whether the hash was made by another hasher than the preferred one, or with weaker parameters."""
+    try:
+        hasher = identify_hasher(encoded)
+    except ValueError:
+        # unusable or unrecognised, so there is nothing to upgrade
+        return False
+    preferred = get_hasher('default')
+    return hasher.algorithm != preferred.algorithm or preferred.must_update(encoded)
+
+
+@functools.lru_cache(maxsize=None)
+def get_hashing_limiter():
+    return PasswordHashingLimiter(
+        max_concurrency=settings.PASSWORD_HASHING_MAX_CONCURRENCY,
+        slot_timeout=settings.PASSWORD_HASHING_SLOT_TIMEOUT_SECONDS,
+    )
@@ -0,0 +1,49 @@
+import math
+import statistics
+import time
+
+from django.contrib.auth.hashers import get_hashers
+from django.core.management.base import BaseCommand
+
+BENCHMARK_PASSWORD = 'calibrate-password-hashers'
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks the configured password hashers and reports the work factor that meets a target latency.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target-ms', type=float, default=250, help='Target time to hash one password.')
+        parser.add_argument('--samples', type=int, default=5, help='Number of hashes to time per hasher.')
+
+    def handle(self, *args, **options):
+        target_ms = options['target_ms']
+        for hasher in get_hashers():
+            try:
+                elapsed_ms = self.benchmark(hasher, samples=options['samples'])
+            except ValueError:
+                # the hasher's library is not installed
+                self.stdout.write(f'{hasher.algorithm}: unavailable')
+                continue
+            recommendation = get_recommendation(hasher, elapsed_ms, target_ms)
+            self.stdout.write(f'{hasher.algorithm}: {elapsed_ms:.1f}ms{recommendation}')
+
+    @staticmethod
+    def benchmark(hasher, samples):
+        timings = []
+        for _ in range(samples):
+            started = time.perf_counter()
+            hasher.encode(BENCHMARK_PASSWORD, hasher.salt())
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings)
+
+
+def get_recommendation(hasher, elapsed_ms, target_ms):
+    if hasattr(hasher, 'iterations'):
+        # PBKDF2 cost is linear in the iteration count
+        iterations = max(1000, int(round(hasher.iterations * target_ms / elapsed_ms, -3)))
+        return f' at {hasher.iterations} iterations, use {iterations} iterations for {target_ms:g}ms'
+    if hasattr(hasher, 'rounds'):
+        # bcrypt cost doubles with each round
+        rounds = max(4, hasher.rounds + round(math.log2(target_ms / elapsed_ms)))
+        return f' at {hasher.rounds} rounds, use {rounds} rounds for {target_ms:g}ms'
+    return ''
@@ -0,0 +1,42 @@
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+from django.core.management import call_command
+
+from sso.user.management.commands.calibrate_password_hashers import get_recommendation
+
+
+def test_calibrate_password_hashers(settings):
+    settings.PASSWORD_HASHERS = ['sso.user.hashers.PBKDF2PasswordHasher']
+    settings.PASSWORD_HASHING_PBKDF2_ITERATIONS = 1000
+    out = StringIO()
+
+    call_command('calibrate_password_hashers', '--samples=1', stdout=out)
+
+    assert out.getvalue().startswith('pbkdf2_sha256: ')
+    assert 'at 1000 iterations, use ' in out.getvalue()
+
+
+def test_calibrate_password_hashers_unavailable_library(settings):
+    settings.PASSWORD_HASHERS = ['django.contrib.auth.hashers.Argon2PasswordHasher']
+    out = StringIO()
+
+    with mock.patch('django.contrib.auth.hashers.Argon2PasswordHasher.encode', side_effect=ValueError):
+        call_command('calibrate_password_hashers', '--samples=1', stdout=out)
+
+    assert out.getvalue() == 'argon2: unavailable\n'
+
+
+def test_get_recommendation_scales_iterations():
+    hasher = mock.Mock(spec=PBKDF2PasswordHasher, iterations=100000)
+
+    assert get_recommendation(hasher, elapsed_ms=50, target_ms=250) == (
+        ' at 100000 iterations, use 500000 iterations for 250ms'
+    )
+
+
+def test_get_recommendation_scales_rounds():
+    hasher = mock.Mock(spec=['rounds'], rounds=12)
+
+    assert get_recommendation(hasher, elapsed_ms=500, target_ms=250) == ' at 12 rounds, use 11 rounds for 250ms'
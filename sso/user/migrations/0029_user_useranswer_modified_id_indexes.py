@@ -0,0 +1,22 @@
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # concurrent index builds cannot run in a transaction, and do not block writes to these busy tables
+    atomic = False
+
+    dependencies = [
+        ('user', '0028_alter_dataretentionstatistics_id_and_more'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='user',
+            index=models.Index(fields=['modified', 'id'], name='user_user_modified_id_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='useranswer',
+            index=models.Index(fields=['modified', 'id'], name='user_answer_modified_id_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.20 on 2026-10-18 10:05
+
+import django.core.serializers.json
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0029_user_useranswer_modified_id_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('transaction_id', models.BigIntegerField()),
+                ('created', models.DateTimeField(default=django.utils.timezone.now)),
+                ('action', models.CharField(choices=[('Update', 'Update'), ('Delete', 'Delete')], max_length=16)),
+                ('model', models.CharField(max_length=64)),
+                ('object_id', models.BigIntegerField()),
+                ('user_id', models.BigIntegerField(null=True)),
+                ('data', models.JSONField(default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+            ],
+            options={
+                'indexes': [
+                    models.Index(fields=['transaction_id', 'id'], name='user_outbox_txid_id_idx'),
+                    models.Index(fields=['user_id'], name='user_outbox_user_id_idx'),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # concurrent index builds cannot run in a transaction, and do not block writes to these busy tables
+    atomic = False
+
+    dependencies = [
+        ('user', '0030_outboxevent'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='userprofile',
+            index=models.Index(fields=['modified', 'id'], name='user_profile_modified_id_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='userpageview',
+            index=models.Index(fields=['modified', 'id'], name='user_pageview_modified_id_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='lessoncompleted',
+            index=models.Index(fields=['modified', 'id'], name='user_lesson_modified_id_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='userdata',
+            index=models.Index(fields=['modified', 'id'], name='user_data_modified_id_idx'),
+        ),
+    ]
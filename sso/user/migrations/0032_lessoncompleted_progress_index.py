@@ -0,0 +1,18 @@
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # concurrent index builds cannot run in a transaction, and do not block writes to this busy table
+    atomic = False
+
+    dependencies = [
+        ('user', '0031_activity_stream_feed_indexes'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='lessoncompleted',
+            index=models.Index(fields=['user', 'service', 'module'], name='user_lesson_progress_idx'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+from django.db import migrations
+from django.db.models import Count, Min
+
+
+def merge_duplicate_services(apps, schema_editor):
+    """Merge services that share a name into the oldest of them, along with their pages and page views"""
+    Service = apps.get_model('user', 'Service')
+    ServicePage = apps.get_model('user', 'ServicePage')
+    UserPageView = apps.get_model('user', 'UserPageView')
+    LessonCompleted = apps.get_model('user', 'LessonCompleted')
+    Question = apps.get_model('user', 'Question')
+
+    duplicates = Service.objects.values('name').annotate(count=Count('id'), kept_id=Min('id')).filter(count__gt=1)
+    for duplicate in duplicates:
+        kept_id = duplicate['kept_id']
+        duplicate_ids = list(
+            Service.objects.filter(name=duplicate['name']).exclude(pk=kept_id).values_list('pk', flat=True)
+        )
+        LessonCompleted.objects.filter(service_id__in=duplicate_ids).update(service_id=kept_id)
+        Question.objects.filter(service_id__in=duplicate_ids).update(service_id=kept_id)
+        for service_page in ServicePage.objects.filter(service_id__in=duplicate_ids):
+            kept_page = ServicePage.objects.filter(service_id=kept_id, page_name=service_page.page_name).first()
+            if kept_page is None:
+                ServicePage.objects.filter(pk=service_page.pk).update(service_id=kept_id)
+                continue
+            # a user views a page once, so views of both copies by the same user keep the kept page's one
+            UserPageView.objects.filter(service_page_id=service_page.pk).exclude(
+                user_id__in=UserPageView.objects.filter(service_page_id=kept_page.pk).values('user_id')
+            ).update(service_page_id=kept_page.pk)
+            ServicePage.objects.filter(pk=service_page.pk).delete()
+        Service.objects.filter(pk__in=duplicate_ids).delete()
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('user', '0032_lessoncompleted_progress_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_services, reverse_code=migrations.RunPython.noop),
+    ]
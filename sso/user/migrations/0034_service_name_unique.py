@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # a separate migration, as Postgres will not alter a table with foreign key checks pending from the merge
+    dependencies = [
+        ('user', '0033_merge_duplicate_services'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='service',
+            name='name',
+            field=models.CharField(max_length=128, unique=True),
+        ),
+    ]
@@ -4,16 +4,22 @@ from dateutil.relativedelta import relativedelta
 from directory_constants import choices
 from django.conf import settings
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
-from django.core.mail import send_mail
-from django.db import models
-from django.db.models import JSONField, Q
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, transaction
+from django.db.models import F, JSONField, Q
 from django.urls import reverse
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from sort_order_field import SortOrderField
 
+from core.cache_invalidation import registry
+from sso import tasks
 from sso.api.model_utils import TimeStampedModel
 from sso.constants import API_DATETIME_FORMAT
+from sso.user.hashing import get_hashing_limiter
+
+SUSPICIOUS_LOGIN_NOTIFIED_CACHE_KEY = 'sso:suspicious-login-notified:{user_id}'
 
 
 class UserManager(BaseUserManager):
@@ -51,6 +57,18 @@ class UserManager(BaseUserManager):
         return user
 
 
+class OutboxMixin:
+    """Saves in a transaction, so the outbox event written by sso.user.signals commits or rolls back with the change.
+
+    For the models in sso.user.signals.OUTBOX_FIELDS. Deletes already run in
+    one.
+    """
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic(using=kwargs.get('using'), savepoint=False):
+            super().save(*args, **kwargs)
+
+
 class InactiveUserManager(models.Manager):
     def get_queryset(self):
         date = timezone.now() - relativedelta(years=settings.DATA_RETENTION_STORAGE_YEARS)
@@ -74,7 +92,7 @@ class InactiveUserManager(models.Manager):
         )
 
 
-class User(AbstractBaseUser, PermissionsMixin, TimeStampedModel):
+class User(OutboxMixin, AbstractBaseUser, PermissionsMixin, TimeStampedModel):
 
     email = models.EmailField(_('email'), unique=True)
     is_staff = models.BooleanField(
@@ -107,6 +125,10 @@ class User(AbstractBaseUser, PermissionsMixin, TimeStampedModel):
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = []
 
+    class Meta:
+        # the activity stream feed pages through users by (modified, id)
+        indexes = [models.Index(fields=['modified', 'id'], name='user_user_modified_id_idx')]
+
     def __str__(self):
         return self.email
 
@@ -119,30 +141,72 @@ class User(AbstractBaseUser, PermissionsMixin, TimeStampedModel):
         return self.email
 
     def check_password(self, raw_password):
-        """Hook to update the failed login attempt counter."""
-        is_correct = super().check_password(raw_password)
+        """Hook to update the failed login attempt counter.
+
+        The hash is verified in one of the node's password hashing slots, and
+        PasswordHashingUnavailable is raised when none is free, which
+        core.middleware answers with a 503 on every path. The counters
+        are written with single column UPDATEs rather than a full save, and not
+        at all when a correct password finds them already reset. With
+        FEATURE_DEFERRED_PASSWORD_REHASH_ENABLED an outdated hash is upgraded on
+        a background thread once the login commits, instead of doubling the
+        hashing cost of the request.
+        """
+        is_correct, must_update = get_hashing_limiter().verify(raw_password, self.password)
+        if is_correct and must_update and settings.FEATURE_DEFERRED_PASSWORD_REHASH_ENABLED and self.pk is not None:
+            self.upgrade_password_hash_later(raw_password)
+        elif is_correct and must_update:
+            self.set_password(raw_password)
+            # Password hash upgrades shouldn't be considered password changes.
+            self._password = None
+            self.save(update_fields=['password'])
+        if self.pk is None:
+            return is_correct
         if is_correct:
+            if User.objects.filter(
+                Q(failed_login_attempts__gt=0) | Q(inactivity_notification__gt=0), pk=self.pk
+            ).update(failed_login_attempts=0, inactivity_notification=0):
+                # update() sends no post_save
+                registry.invalidate(self)
             self.failed_login_attempts = 0
             self.inactivity_notification = 0
-            self.save()
         else:
-            self.failed_login_attempts += 1
-            self.save()
+            self.failed_login_attempts = self.increment_failed_login_attempts()
         self.notify_suspicious_login_activity()
         return is_correct
 
+    def upgrade_password_hash_later(self, raw_password):
+        user_id = self.pk
+
+        def write(password):
+            tasks.upgrade_password_hash.delay(user_id, password)
+
+        transaction.on_commit(lambda: get_hashing_limiter().upgrade_later(raw_password, write))
+
+    def increment_failed_login_attempts(self):
+        users = User.objects.filter(pk=self.pk)
+        # the row stays locked until the transaction ends, so each concurrent attempt reads back its own count and
+        # exactly one of them reaches the threshold
+        with transaction.atomic():
+            users.update(failed_login_attempts=F('failed_login_attempts') + 1)
+            failed_login_attempts = users.values_list('failed_login_attempts', flat=True).first()
+        # update() sends no post_save
+        registry.invalidate(self)
+        return self.failed_login_attempts + 1 if failed_login_attempts is None else failed_login_attempts
+
     def notify_suspicious_login_activity(self):
         notification_threshold = settings.SSO_SUSPICIOUS_LOGIN_MAX_ATTEMPTS
         if self.failed_login_attempts == notification_threshold and settings.SSO_SUSPICIOUS_ACTIVITY_NOTIFICATION_EMAIL:
-            body_message = "{user} tried to login {attempts} times".format(
-                user=self.email, attempts=self.failed_login_attempts
-            )
-            send_mail(
-                subject='Suspicious activity on SSO',
-                message=body_message,
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                recipient_list=[settings.SSO_SUSPICIOUS_ACTIVITY_NOTIFICATION_EMAIL],
-            )
+            cache_key = SUSPICIOUS_LOGIN_NOTIFIED_CACHE_KEY.format(user_id=self.pk)
+            email, attempts = self.email, self.failed_login_attempts
+
+            def notify():
+                # the email is sent by a worker, at most once per user per window
+                if cache.add(cache_key, True, settings.SSO_SUSPICIOUS_LOGIN_NOTIFICATION_WINDOW_SECONDS):
+                    tasks.notify_suspicious_login_activity.delay(email, attempts)
+
+            # guarded once committed, so that a rolled back attempt does not suppress the next notification
+            transaction.on_commit(notify)
 
     def get_password_reset_link(self):
         return reverse(
@@ -159,7 +223,7 @@ class User(AbstractBaseUser, PermissionsMixin, TimeStampedModel):
         return reverse("account_confirm_email", args=[email_confirmation.key])
 
 
-class UserProfile(TimeStampedModel):
+class UserProfile(OutboxMixin, TimeStampedModel):
     # TODO: move these over to directory-constants
     CORE_SEGMENTS = [
         ('SUSTAIN', 'Sustain'),
@@ -170,6 +234,7 @@ class UserProfile(TimeStampedModel):
 
     class Meta:
         ordering = ['-created']
+        indexes = [models.Index(fields=['modified', 'id'], name='user_profile_modified_id_idx')]
 
     user = models.OneToOneField(User, related_name='user_profile', on_delete=models.CASCADE)
     first_name = models.CharField(max_length=128)
@@ -197,7 +262,7 @@ class DataRetentionStatistics(TimeStampedModel):
 
 class Service(TimeStampedModel):
     # a service name e.g. great-cms
-    name = models.CharField(max_length=128)
+    name = models.CharField(max_length=128, unique=True)
 
 
 class ServicePage(TimeStampedModel):
@@ -209,13 +274,14 @@ class ServicePage(TimeStampedModel):
         unique_together = [['service', 'page_name']]
 
 
-class UserPageView(TimeStampedModel):
+class UserPageView(OutboxMixin, TimeStampedModel):
     # Records an instance of a user reading a page ONCE. Subsequent reads will add extra records
     service_page = models.ForeignKey(ServicePage, on_delete=models.CASCADE, related_name='page_views')
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='page_views')
 
     class Meta:
         unique_together = [['user', 'service_page']]
+        indexes = [models.Index(fields=['modified', 'id'], name='user_pageview_modified_id_idx')]
 
     def to_dict(self):
         return {
@@ -225,8 +291,20 @@ class UserPageView(TimeStampedModel):
             'created': self.created.strftime(API_DATETIME_FORMAT),
         }
 
+    # the values() that values_to_dict() shapes like to_dict(), so that lists of views are read in one query
+    DICT_VALUES = ('service_page__service__name', 'service_page__page_name', 'modified', 'created')
 
-class LessonCompleted(TimeStampedModel):
+    @staticmethod
+    def values_to_dict(row):
+        return {
+            'service': row['service_page__service__name'],
+            'page': row['service_page__page_name'],
+            'modified': row['modified'].strftime(API_DATETIME_FORMAT),
+            'created': row['created'].strftime(API_DATETIME_FORMAT),
+        }
+
+
+class LessonCompleted(OutboxMixin, TimeStampedModel):
     service = models.ForeignKey(Service, on_delete=models.CASCADE)
     lesson_page = models.CharField(max_length=255)
     lesson = models.IntegerField()
@@ -235,6 +313,10 @@ class LessonCompleted(TimeStampedModel):
 
     class Meta:
         unique_together = [['user', 'lesson']]
+        indexes = [
+            models.Index(fields=['modified', 'id'], name='user_lesson_modified_id_idx'),
+            models.Index(fields=['user', 'service', 'module'], name='user_lesson_progress_idx'),
+        ]
 
     def to_dict(self):
         return {
@@ -242,11 +324,26 @@ class LessonCompleted(TimeStampedModel):
             'lesson_page': self.lesson_page,
             'lesson': self.lesson,
             'module': self.module,
-            'user': self.user.id,
+            'user': self.user_id,
             'modified': self.modified.strftime(API_DATETIME_FORMAT),
             'created': self.created.strftime(API_DATETIME_FORMAT),
         }
 
+    # the values() that values_to_dict() shapes like to_dict(), so that lists of lessons are read in one query
+    DICT_VALUES = ('service__name', 'lesson_page', 'lesson', 'module', 'user_id', 'modified', 'created')
+
+    @staticmethod
+    def values_to_dict(row):
+        return {
+            'service': row['service__name'],
+            'lesson_page': row['lesson_page'],
+            'lesson': row['lesson'],
+            'module': row['module'],
+            'user': row['user_id'],
+            'modified': row['modified'].strftime(API_DATETIME_FORMAT),
+            'created': row['created'].strftime(API_DATETIME_FORMAT),
+        }
+
 
 QUESTION_TYPES = [
     ('RADIO', 'Radio'),
@@ -289,7 +386,7 @@ class Question(TimeStampedModel):
         )
         question_choices = self.question_choices or {'options': []}
         if question_options:
-            question_choices['options'] = question_choices.get('options', []) + question_options
+            question_choices = {**question_choices, 'options': question_choices.get('options', []) + question_options}
         return {
             'id': self.id,
             'name': self.name,
@@ -299,8 +396,21 @@ class Question(TimeStampedModel):
             'order': self.sort_order,
         }
 
-
-class UserAnswer(TimeStampedModel):
+    def get_choice_labels(self):
+        """Map each choice value to its label, resolving the same choices as to_dict() without mutating them."""
+        question_choices = self.question_choices or {'options': []}
+        options = question_choices if isinstance(question_choices, list) else question_choices.get('options', [])
+        predefined_options = [
+            {'label': label, 'value': value} for value, label in choices.__dict__.get(self.predefined_choices, [])
+        ]
+        labels = {}
+        for option in [*options, *predefined_options]:
+            # the first option with a value wins, as it did when the options were scanned
+            labels.setdefault(option.get('value'), option.get('label'))
+        return labels
+
+
+class UserAnswer(OutboxMixin, TimeStampedModel):
     question = models.ForeignKey(Question, on_delete=models.CASCADE)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     answer = JSONField(blank=True, null=True, default=dict)
@@ -308,15 +418,17 @@ class UserAnswer(TimeStampedModel):
     class Meta:
         ordering = ('user', 'question__sort_order')
         unique_together = [['user', 'question']]
+        # the activity stream feed pages through answers by (modified, id)
+        indexes = [models.Index(fields=['modified', 'id'], name='user_answer_modified_id_idx')]
 
     def to_dict(self):
-        return {'question_id': self.question.id, 'answer': self.answer}
+        return {'question_id': self.question_id, 'answer': self.answer}
 
     def __str__(self):
         return str(f'{self.user} : {self.question.name}')
 
 
-class UserData(TimeStampedModel):
+class UserData(OutboxMixin, TimeStampedModel):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     name = models.CharField(max_length=128)
     data = JSONField(blank=True, default=dict)
@@ -327,4 +439,37 @@ class UserData(TimeStampedModel):
     class Meta:
         unique_together = [['user', 'name']]
         ordering = ['user']
+        indexes = [models.Index(fields=['modified', 'id'], name='user_data_modified_id_idx')]
         verbose_name_plural = 'User data'
+
+
+class OutboxEvent(models.Model):
+    """Append-only log of changes to user data, for activity stream consumers.
+
+    Events are written by sso.user.signals in the same transaction as the
+    change they record, and are never updated except to redact a deleted
+    user's data. `transaction_id` is the id of that transaction, which the
+    feed orders by so that a change committing late is never skipped.
+    """
+
+    ACTION_UPDATE = 'Update'
+    ACTION_DELETE = 'Delete'
+    ACTIONS = [(ACTION_UPDATE, 'Update'), (ACTION_DELETE, 'Delete')]
+
+    transaction_id = models.BigIntegerField()
+    created = models.DateTimeField(default=timezone.now)
+    action = models.CharField(max_length=16, choices=ACTIONS)
+    model = models.CharField(max_length=64)
+    object_id = models.BigIntegerField()
+    # not a foreign key, so that events outlive the user
+    user_id = models.BigIntegerField(null=True)
+    data = JSONField(default=dict, encoder=DjangoJSONEncoder)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['transaction_id', 'id'], name='user_outbox_txid_id_idx'),
+            models.Index(fields=['user_id'], name='user_outbox_user_id_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.action} {self.model} {self.object_id}'
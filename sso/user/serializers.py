@@ -1,11 +1,14 @@
+from django.conf import settings
 from django.contrib.auth import password_validation
 from django.db import transaction
+from django.db.models import prefetch_related_objects
+from django.db.models.manager import BaseManager
 from django.utils.encoding import force_bytes
 from django.utils.http import urlsafe_base64_encode
 from rest_framework import serializers
 
 from sso.user import utils
-from sso.user.models import User, UserAnswer, UserProfile
+from sso.user.models import User, UserProfile
 from sso.verification import helpers
 from sso.verification.models import VerificationCode
 
@@ -33,6 +36,23 @@ class PasswordCheckSerializer(serializers.Serializer):
     session_key = serializers.CharField(style={'input_type': 'password'})
 
 
+class SessionKeysSerializer(serializers.Serializer):
+    session_keys = serializers.ListField(
+        child=serializers.CharField(), allow_empty=False, max_length=settings.SSO_SESSION_USER_BATCH_MAX_SIZE
+    )
+
+
+class PageViewSerializer(serializers.Serializer):
+    service = serializers.CharField(max_length=128)
+    page = serializers.CharField(max_length=128)
+
+
+class PageViewsSerializer(serializers.Serializer):
+    page_views = serializers.ListField(
+        child=PageViewSerializer(), allow_empty=False, max_length=settings.SSO_PAGE_VIEW_BATCH_MAX_SIZE
+    )
+
+
 class CreateUserSerializer(serializers.ModelSerializer):
     verification_code = VerificationCodeSerializer(read_only=True)
     uidb64 = serializers.SerializerMethodField()
@@ -68,6 +88,11 @@ class CreateUserSerializer(serializers.ModelSerializer):
         return instance
 
 
+def get_first_social_account(user):
+    # read through the prefetched accounts rather than socialaccount_set.first(), which always queries
+    return min(user.socialaccount_set.all(), key=lambda account: account.pk, default=None)
+
+
 class UserProfileSerializer(serializers.ModelSerializer):
     profile_image = serializers.SerializerMethodField()
     social_account = serializers.SerializerMethodField()
@@ -84,20 +109,33 @@ class UserProfileSerializer(serializers.ModelSerializer):
             'social_account',
         )
 
+    def to_representation(self, instance):
+        prefetch_related_objects([instance], 'user__socialaccount_set')
+        return super().to_representation(instance)
+
     def get_profile_image(self, obj):
-        account = obj.user.socialaccount_set.first()
+        account = get_first_social_account(obj.user)
         if account:
             return utils.get_social_account_image(account)
 
     def get_social_account(self, obj):
-        account = obj.user.socialaccount_set.first()
+        account = get_first_social_account(obj.user)
         return account.provider if account else 'email'
 
     def to_internal_value(self, data):
         return {**data, 'user_id': self.context['request'].user.pk}
 
 
+class UserListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        users = list(data.all() if isinstance(data, BaseManager) else data)
+        prefetch_related_objects(users, 'socialaccount_set')
+        return super().to_representation(users)
+
+
 class UserSerializer(serializers.ModelSerializer):
+    """Loads the social accounts once, for one user or a whole list, and shares them with the nested profile."""
+
     user_profile = UserProfileSerializer()
     social_login = serializers.SerializerMethodField()
 
@@ -110,45 +148,27 @@ class UserSerializer(serializers.ModelSerializer):
             'social_login',
             'user_profile',
         )
+        list_serializer_class = UserListSerializer
+
+    def to_representation(self, instance):
+        prefetch_related_objects([instance], 'socialaccount_set')
+        return super().to_representation(instance)
 
     def get_social_login(self, obj):
         return bool(obj.socialaccount_set.all())
 
 
-class ActivityStreamUsersSerializer(serializers.ModelSerializer):
-    telephone = serializers.CharField(source='user_profile.mobile_phone_number')
+def get_answer_label(question_type, answer, choice_labels):
+    if question_type in ['SELECT', 'RADIO']:
+        return get_choice_label(choice_labels, answer) or ''
 
-    class Meta:
-        model = User
-        fields = ('id', 'hashed_uuid', 'email', 'telephone', 'date_joined', 'modified', 'last_login')
+    elif question_type == 'MULTI_SELECT':
+        return [get_choice_label(choice_labels, value) or '' for value in answer]
 
 
-class ActivityStreamUserAnswerSerializer(serializers.ModelSerializer):
-    question_title = serializers.CharField(source='question.title')
-    answer_label = serializers.SerializerMethodField()
-    hashed_uuid = serializers.CharField(source='user.hashed_uuid')
-
-    class Meta:
-        model = UserAnswer
-        fields = ('id', 'user_id', 'hashed_uuid', 'answer', 'modified', 'question_id', 'question_title', 'answer_label')
-
-    def get_answer_label(self, obj):
-        if obj.question.question_type in ['SELECT', 'RADIO']:
-            return self.get_choice_value(obj.answer, obj.question.to_dict()['choices']) or ''
-
-        elif obj.question.question_type == 'MULTI_SELECT':
-            answer_list = [
-                self.get_choice_value(
-                    answer,
-                    obj.question.to_dict()['choices'],
-                )
-                or ''
-                for answer in obj.answer
-            ]
-            return answer_list
-
-    def get_choice_value(self, value, choices_array):
-        choices_list = choices_array if isinstance(choices_array, list) else choices_array.get('options', choices_array)
-        for c in choices_list:
-            if c.get('value') == value:
-                return c.get('label')
+def get_choice_label(choice_labels, value):
+    try:
+        return choice_labels.get(value)
+    except TypeError:
+        # answers such as dicts are unhashable, and match no choice
+        return None
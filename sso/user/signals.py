@@ -1,8 +1,79 @@
 import uuid
 
+from django.db import models
+from django.utils import timezone
+
+from core.cache_invalidation import registry
 from core.helpers import createHash
+from sso.user.models import OutboxEvent
+
+# The fields each model records in the outbox. Passwords and other credentials are deliberately left out.
+OUTBOX_FIELDS = {
+    'user.User': ('hashed_uuid', 'email', 'date_joined', 'last_login', 'is_active'),
+    'user.UserProfile': ('first_name', 'last_name', 'job_title', 'mobile_phone_number', 'segment'),
+    'user.UserAnswer': ('question_id', 'answer'),
+    'user.UserPageView': ('service_page_id',),
+    'user.LessonCompleted': ('service_id', 'lesson_page', 'lesson', 'module'),
+    'user.UserData': ('name', 'data'),
+}
 
 
 def create_uuid(sender, instance, *args, **kwargs):
     if not instance.hashed_uuid:
         instance.hashed_uuid = createHash(uuid.uuid4())
+
+
+def update_last_login(sender, user, **kwargs):
+    # Replaces django.contrib.auth.models.update_last_login so that logging in also moves the user's position in
+    # the activity stream, which is ordered by `modified`.
+    user.last_login = timezone.now()
+    user.save(update_fields=['last_login', 'modified'])
+
+
+def get_outbox_user_id(instance):
+    return instance.pk if instance._meta.label == 'user.User' else instance.user_id
+
+
+def get_outbox_event(instance, action, data):
+    return OutboxEvent(
+        transaction_id=models.Func(function='txid_current', output_field=models.BigIntegerField()),
+        action=action,
+        model=instance._meta.object_name,
+        object_id=instance.pk,
+        user_id=get_outbox_user_id(instance),
+        data=data,
+    )
+
+
+def create_outbox_event(instance, action, data):
+    get_outbox_event(instance, action, data).save()
+
+
+def get_outbox_data(instance):
+    return {field: getattr(instance, field) for field in OUTBOX_FIELDS[instance._meta.label]}
+
+
+def record_outbox_save(sender, instance, **kwargs):
+    create_outbox_event(instance, OutboxEvent.ACTION_UPDATE, get_outbox_data(instance))
+
+
+def record_bulk_create(instances):
+    """Does for rows inserted with bulk_create, which sends no post_save, what the post_save receivers would.
+
+    The outbox events are inserted together, and the cache invalidations are
+    coalesced like any others.
+    """
+    OutboxEvent.objects.bulk_create(
+        get_outbox_event(instance, OutboxEvent.ACTION_UPDATE, get_outbox_data(instance))
+        for instance in instances
+        if instance._meta.label in OUTBOX_FIELDS
+    )
+    for instance in instances:
+        registry.invalidate(instance)
+
+
+def record_outbox_delete(sender, instance, **kwargs):
+    if instance._meta.label == 'user.User':
+        # a deleted user's personal data must not live on in the log
+        OutboxEvent.objects.filter(user_id=instance.pk).update(data={})
+    create_outbox_event(instance, OutboxEvent.ACTION_DELETE, {})
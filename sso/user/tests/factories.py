@@ -39,6 +39,7 @@ class ServiceFactory(factory.django.DjangoModelFactory):
 
     class Meta:
         model = models.Service
+        django_get_or_create = ('name',)
 
 
 class QuestionFactory(factory.django.DjangoModelFactory):
@@ -55,3 +56,40 @@ class UserAnswerFactory(factory.django.DjangoModelFactory):
 
     class Meta:
         model = models.UserAnswer
+
+
+class ServicePageFactory(factory.django.DjangoModelFactory):
+    service = factory.SubFactory(ServiceFactory)
+    page_name = factory.fuzzy.FuzzyText()
+
+    class Meta:
+        model = models.ServicePage
+        django_get_or_create = ('service', 'page_name')
+
+
+class UserPageViewFactory(factory.django.DjangoModelFactory):
+    service_page = factory.SubFactory(ServicePageFactory)
+    user = factory.SubFactory(UserFactory)
+
+    class Meta:
+        model = models.UserPageView
+
+
+class LessonCompletedFactory(factory.django.DjangoModelFactory):
+    service = factory.SubFactory(ServiceFactory)
+    lesson_page = factory.fuzzy.FuzzyText()
+    lesson = factory.Sequence(lambda n: n)
+    module = factory.fuzzy.FuzzyInteger(low=1)
+    user = factory.SubFactory(UserFactory)
+
+    class Meta:
+        model = models.LessonCompleted
+
+
+class UserDataFactory(factory.django.DjangoModelFactory):
+    user = factory.SubFactory(UserFactory)
+    name = factory.fuzzy.FuzzyText()
+    data = factory.Dict({'key': 'value'})
+
+    class Meta:
+        model = models.UserData
@@ -0,0 +1,92 @@
+import pytest
+from django.core.cache import cache
+
+from sso.user import catalogue
+from sso.user.models import Service, ServicePage
+from sso.user.tests.factories import QuestionFactory, ServiceFactory
+
+
+@pytest.mark.django_db
+def test_get_service_cached(django_assert_num_queries):
+    service = ServiceFactory(name='great')
+    catalogue.get_service('great')
+
+    with django_assert_num_queries(0):
+        assert catalogue.get_service('great').pk == service.pk
+        # another process finds it in the shared cache
+        catalogue.local_catalogue.clear()
+        assert catalogue.get_service('great').pk == service.pk
+
+
+@pytest.mark.django_db
+def test_get_service_missing():
+    with pytest.raises(Service.DoesNotExist):
+        catalogue.get_service('great')
+
+    service = catalogue.get_service('great', create=True)
+
+    assert Service.objects.get(name='great').pk == service.pk
+
+
+@pytest.mark.django_db
+def test_get_service_page(django_assert_num_queries):
+    service = catalogue.get_service('great', create=True)
+    with pytest.raises(ServicePage.DoesNotExist):
+        catalogue.get_service_page(service, 'home')
+
+    service_page = catalogue.get_service_page(service, 'home', create=True)
+
+    with django_assert_num_queries(0):
+        assert catalogue.get_service_page(service, 'home').pk == service_page.pk
+    assert ServicePage.objects.get(service=service, page_name='home').pk == service_page.pk
+
+
+@pytest.mark.django_db
+def test_service_change_evicts_catalogue(django_capture_on_commit_callbacks):
+    with django_capture_on_commit_callbacks(execute=True):
+        service = ServiceFactory(name='great')
+    catalogue.get_service('great')
+    version = cache.get(catalogue.CATALOGUE_VERSION_CACHE_KEY)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        service.name = 'great-cms'
+        service.save()
+
+    assert catalogue.local_catalogue.get(catalogue.SERVICE_ID_CACHE_KEY.format(name='great') + f':{version}') is None
+    assert cache.get(catalogue.CATALOGUE_VERSION_CACHE_KEY) is None
+    with pytest.raises(Service.DoesNotExist):
+        catalogue.get_service('great')
+
+
+@pytest.mark.django_db
+def test_service_change_in_another_process_evicts_local_catalogue():
+    service = ServiceFactory(name='great')
+    catalogue.get_service('great')
+
+    # another process renames the service, which retires the shared version but not this process's entries
+    Service.objects.filter(pk=service.pk).update(name='great-cms')
+    cache.delete(catalogue.CATALOGUE_VERSION_CACHE_KEY)
+
+    with pytest.raises(Service.DoesNotExist):
+        catalogue.get_service('great')
+
+
+@pytest.mark.django_db
+def test_get_questions_cached_per_version(django_assert_num_queries, django_capture_on_commit_callbacks):
+    with django_capture_on_commit_callbacks(execute=True):
+        service = ServiceFactory()
+        question = QuestionFactory(service=service, title='Turnover', predefined_choices='TURNOVER_CHOICES')
+        QuestionFactory(service=service, is_active=False)
+    questions = catalogue.get_questions(service)
+
+    with django_assert_num_queries(0):
+        assert catalogue.get_questions(service) is questions
+    assert [item['title'] for item in questions] == ['Turnover']
+    with pytest.raises(TypeError):
+        questions[0]['choices']['title'] = 'changed'
+
+    with django_capture_on_commit_callbacks(execute=True):
+        question.title = 'Annual turnover'
+        question.save()
+
+    assert [item['title'] for item in catalogue.get_questions(service)] == ['Annual turnover']
@@ -0,0 +1,174 @@
+import datetime
+from unittest import mock
+
+import pytest
+from django.contrib.auth.hashers import check_password, make_password
+from django_redis import get_redis_connection
+from freezegun import freeze_time
+from redis.exceptions import ConnectionError
+
+from sso.user.hashing import PasswordHashingLimiter, PasswordHashingUnavailable, get_hashing_limiter, is_hash_outdated
+from sso.user.tests.factories import UserFactory
+
+
+@pytest.fixture
+def limiter():
+    return PasswordHashingLimiter(max_concurrency=1, slot_timeout=30, host='node')
+
+
+def test_hashing_limiter_verify(limiter):
+    encoded = make_password('password')
+
+    assert limiter.verify('password', encoded) == (True, False)
+    assert limiter.verify('wrong', encoded) == (False, False)
+    assert get_redis_connection('default').zcard(limiter.cache_key) == 0
+
+
+def test_hashing_limiter_verify_outdated_hash(limiter):
+    encoded = make_password('password', hasher='pbkdf2_sha1')
+
+    assert limiter.verify('password', encoded) == (True, True)
+    assert limiter.verify('wrong', encoded) == (False, False)
+
+
+def test_hashing_limiter_sheds_load_across_workers_on_a_node(limiter):
+    # another worker process on the same node is hashing
+    token = PasswordHashingLimiter(max_concurrency=1, slot_timeout=30, host='node').acquire()
+
+    with pytest.raises(PasswordHashingUnavailable):
+        limiter.verify('password', make_password('password'))
+    other_node = PasswordHashingLimiter(max_concurrency=1, slot_timeout=30, host='other-node')
+    assert other_node.verify('password', make_password('password')) == (True, False)
+
+    limiter.release(token)
+    assert limiter.verify('password', make_password('password')) == (True, False)
+
+
+def test_hashing_limiter_frees_slots_of_dead_workers(limiter):
+    with freeze_time(datetime.datetime.now() - datetime.timedelta(seconds=31)):
+        limiter.acquire()
+
+    assert limiter.verify('password', make_password('password')) == (True, False)
+
+
+@mock.patch('sso.user.hashing.get_redis_connection', side_effect=ConnectionError)
+def test_hashing_limiter_redis_unavailable(mock_get_redis_connection, limiter):
+    assert limiter.verify('password', make_password('password')) == (True, False)
+
+
+def test_get_hashing_limiter_uses_settings(settings):
+    limiter = get_hashing_limiter()
+
+    assert limiter.max_concurrency == settings.PASSWORD_HASHING_MAX_CONCURRENCY
+    assert limiter.slot_timeout == settings.PASSWORD_HASHING_SLOT_TIMEOUT_SECONDS
+
+
+@pytest.mark.django_db
+def test_check_password_upgrades_outdated_hash():
+    user = UserFactory(password=make_password('password', hasher='pbkdf2_sha1'))
+
+    assert user.check_password('password') is True
+
+    user.refresh_from_db()
+    assert user.password.startswith('pbkdf2_sha256$')
+
+
+@pytest.mark.django_db
+@mock.patch.object(PasswordHashingLimiter, 'verify', side_effect=PasswordHashingUnavailable)
+def test_check_password_no_hashing_slot(mock_verify):
+    user = UserFactory(password=make_password('password'))
+
+    with pytest.raises(PasswordHashingUnavailable):
+        user.check_password('password')
+
+    user.refresh_from_db()
+    assert user.failed_login_attempts == 0
+
+
+def test_hashing_limiter_upgrade_later(limiter):
+    callback = mock.Mock()
+
+    limiter.upgrade_later('password', callback).result()
+
+    encoded = callback.call_args.args[0]
+    assert encoded.startswith('pbkdf2_sha256$')
+    assert check_password('password', encoded)
+    assert get_redis_connection('default').zcard(limiter.cache_key) == 0
+
+
+def test_hashing_limiter_upgrade_later_takes_a_slot(limiter):
+    slots_taken = []
+
+    def hash_password(raw_password):
+        slots_taken.append(get_redis_connection('default').zcard(limiter.cache_key))
+        return make_password(raw_password)
+
+    with mock.patch('sso.user.hashing.make_password', side_effect=hash_password):
+        limiter.upgrade_later('password', mock.Mock()).result()
+
+    assert slots_taken == [1]
+    assert get_redis_connection('default').zcard(limiter.cache_key) == 0
+
+
+def test_hashing_limiter_upgrade_later_skipped_without_a_slot(limiter):
+    limiter.acquire()
+    callback = mock.Mock()
+
+    with mock.patch('sso.user.hashing.make_password') as mock_make_password:
+        limiter.upgrade_later('password', callback).result()
+
+    assert mock_make_password.call_count == 0
+    assert callback.call_count == 0
+    # the upgrade is no longer pending
+    assert limiter._upgrade_pending.acquire(blocking=False) is True
+
+
+def test_hashing_limiter_upgrade_later_skipped_while_pending(limiter):
+    limiter._upgrade_pending.acquire()
+    callback = mock.Mock()
+
+    assert limiter.upgrade_later('password', callback) is None
+    assert callback.call_count == 0
+
+
+def test_pbkdf2_hasher_iterations_from_settings(settings):
+    settings.PASSWORD_HASHING_PBKDF2_ITERATIONS = 1000
+
+    assert make_password('password').startswith('pbkdf2_sha256$1000$')
+
+
+@pytest.mark.django_db
+@mock.patch('sso.tasks.upgrade_password_hash')
+@mock.patch.object(PasswordHashingLimiter, 'upgrade_later')
+def test_check_password_defers_hash_upgrade(
+    mock_upgrade_later, mock_task, settings, django_capture_on_commit_callbacks
+):
+    settings.FEATURE_DEFERRED_PASSWORD_REHASH_ENABLED = True
+    outdated_password = make_password('password', hasher='pbkdf2_sha1')
+    user = UserFactory(password=outdated_password)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        assert user.check_password('password') is True
+        # started only once the login commits
+        assert mock_upgrade_later.call_count == 0
+
+    user.refresh_from_db()
+    assert user.password == outdated_password
+    assert mock_upgrade_later.call_count == 1
+    raw_password, callback = mock_upgrade_later.call_args.args
+    assert raw_password == 'password'
+    callback('upgraded')
+    mock_task.delay.assert_called_once_with(user.pk, 'upgraded')
+
+
+@pytest.mark.parametrize(
+    'encoded,expected',
+    [
+        (make_password('password'), False),
+        (make_password('password', hasher='pbkdf2_sha1'), True),
+        ('pbkdf2_sha256$1000$salt$hash', True),
+        (make_password(None), False),
+    ],
+)
+def test_is_hash_outdated(encoded, expected):
+    assert is_hash_outdated(encoded) is expected
@@ -2,7 +2,10 @@ from unittest import mock
 
 import pytest
 from django.contrib.auth import authenticate
+from django.core.cache import cache
+from django.db import transaction
 
+from core.authentication import SESSION_USER_CACHE_KEY
 from sso.user.models import User
 
 
@@ -57,17 +60,107 @@ def test_correct_authentication_resets_counter(adminsuperuser):
 
 
 @pytest.mark.django_db
-@mock.patch('sso.user.models.send_mail')
-def test_incorrect_auth_threshold_email_trigger(mock_send_mail, adminsuperuser, settings):
+@mock.patch('sso.tasks.notify_suspicious_login_activity')
+def test_incorrect_auth_threshold_email_trigger(
+    mock_notify_suspicious_login_activity, adminsuperuser, settings, django_capture_on_commit_callbacks
+):
     settings.SSO_SUSPICIOUS_ACTIVITY_NOTIFICATION_EMAIL = 'foo@bar.com'
     assert adminsuperuser.failed_login_attempts == 0
-    for i in range(settings.SSO_SUSPICIOUS_LOGIN_MAX_ATTEMPTS):
-        authenticate(username='foo@bar.com', password='foobarb1sdfdsfgds')
-
-    assert mock_send_mail.call_count == 1
-    assert mock_send_mail.call_args == mock.call(
-        from_email='debug',
-        message='foo@bar.com tried to login 10 times',
-        recipient_list=['foo@bar.com'],
-        subject='Suspicious activity on SSO',
-    )
+    with django_capture_on_commit_callbacks(execute=True) as callbacks:
+        for i in range(settings.SSO_SUSPICIOUS_LOGIN_MAX_ATTEMPTS):
+            authenticate(username='foo@bar.com', password='foobarb1sdfdsfgds')
+        # the login path only queues the notification
+        assert mock_notify_suspicious_login_activity.delay.call_count == 0
+
+    assert len(callbacks) == 1
+    assert mock_notify_suspicious_login_activity.delay.call_count == 1
+    assert mock_notify_suspicious_login_activity.delay.call_args == mock.call('foo@bar.com', 10)
+
+
+@pytest.mark.django_db
+@mock.patch('sso.tasks.notify_suspicious_login_activity')
+def test_incorrect_auth_threshold_email_deduplicated(
+    mock_notify_suspicious_login_activity, adminsuperuser, settings, django_capture_on_commit_callbacks
+):
+    settings.SSO_SUSPICIOUS_ACTIVITY_NOTIFICATION_EMAIL = 'foo@bar.com'
+    with django_capture_on_commit_callbacks(execute=True):
+        for _ in range(2):
+            for i in range(settings.SSO_SUSPICIOUS_LOGIN_MAX_ATTEMPTS):
+                authenticate(username='foo@bar.com', password='foobarb1sdfdsfgds')
+            authenticate(username='foo@bar.com', password='3whitehallplace')
+
+    assert mock_notify_suspicious_login_activity.delay.call_count == 1
+
+
+@pytest.mark.django_db
+@mock.patch('sso.tasks.notify_suspicious_login_activity')
+def test_incorrect_auth_threshold_email_not_suppressed_by_rollback(
+    mock_notify_suspicious_login_activity, adminsuperuser, settings, django_capture_on_commit_callbacks
+):
+    settings.SSO_SUSPICIOUS_ACTIVITY_NOTIFICATION_EMAIL = 'foo@bar.com'
+    adminsuperuser.failed_login_attempts = settings.SSO_SUSPICIOUS_LOGIN_MAX_ATTEMPTS
+    with django_capture_on_commit_callbacks(execute=True):
+        try:
+            with transaction.atomic():
+                adminsuperuser.notify_suspicious_login_activity()
+                raise ValueError
+        except ValueError:
+            pass
+        assert mock_notify_suspicious_login_activity.delay.call_count == 0
+
+        adminsuperuser.notify_suspicious_login_activity()
+
+    assert mock_notify_suspicious_login_activity.delay.call_count == 1
+
+
+@pytest.mark.django_db
+def test_correct_authentication_with_reset_counter_does_not_write(adminsuperuser, django_assert_num_queries):
+    user = User.objects.get(pk=adminsuperuser.pk)
+
+    # the conditional UPDATE matches no rows
+    with django_assert_num_queries(1) as captured:
+        assert user.check_password('3whitehallplace') is True
+
+    assert 'failed_login_attempts' in captured.captured_queries[0]['sql']
+    adminsuperuser.refresh_from_db()
+    assert adminsuperuser.modified == user.modified
+
+
+@pytest.mark.django_db
+def test_incorrect_password_increments_counter_from_database(adminsuperuser):
+    stale_user = User.objects.get(pk=adminsuperuser.pk)
+    User.objects.get(pk=adminsuperuser.pk).check_password('wrong')
+
+    stale_user.check_password('wrong')
+
+    assert stale_user.failed_login_attempts == 2
+    adminsuperuser.refresh_from_db()
+    assert adminsuperuser.failed_login_attempts == 2
+
+
+@pytest.mark.django_db
+def test_login_attempt_counters_evict_session_user(django_capture_on_commit_callbacks):
+    with django_capture_on_commit_callbacks(execute=True):
+        user = User.objects.create_user(email='jim@example.com', password='password')
+    cache_key = SESSION_USER_CACHE_KEY.format(user_id=user.pk)
+
+    cache.set(cache_key, user)
+    with django_capture_on_commit_callbacks(execute=True):
+        user.check_password('wrong')
+    assert cache.get(cache_key) is None
+
+    cache.set(cache_key, user)
+    with django_capture_on_commit_callbacks(execute=True):
+        user.check_password('password')
+    assert cache.get(cache_key) is None
+
+
+@pytest.mark.django_db
+def test_login_updates_last_login_and_modified(adminsuperuser, client):
+    modified = adminsuperuser.modified
+
+    assert client.login(username='foo@bar.com', password='3whitehallplace')
+
+    adminsuperuser.refresh_from_db()
+    assert adminsuperuser.last_login is not None
+    assert adminsuperuser.modified > modified
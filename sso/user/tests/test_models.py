@@ -148,6 +148,39 @@ def test_question_object():
     assert expected.to_dict()['name'] == data['name']
 
 
+def test_question_get_choice_labels():
+    question = QuestionFactory.build(
+        question_choices={'options': [{'value': 'a', 'label': 'A'}, {'value': 'a', 'label': 'Duplicate'}]},
+        predefined_choices='TURNOVER_CHOICES',
+    )
+
+    labels = question.get_choice_labels()
+
+    assert labels['a'] == 'A'
+    assert labels['<83k'] == 'Below £83,000 (Below VAT registered)'
+    assert question.question_choices == {
+        'options': [{'value': 'a', 'label': 'A'}, {'value': 'a', 'label': 'Duplicate'}]
+    }
+
+
+def test_question_to_dict_does_not_mutate_choices():
+    question = QuestionFactory.build(
+        question_choices={'options': [{'value': 'a', 'label': 'A'}]}, predefined_choices='TURNOVER_CHOICES'
+    )
+
+    question.to_dict()
+
+    assert question.to_dict()['choices']['options'][0] == {'value': 'a', 'label': 'A'}
+    assert len(question.to_dict()['choices']['options']) == 9
+    assert question.question_choices == {'options': [{'value': 'a', 'label': 'A'}]}
+
+
+def test_question_get_choice_labels_list():
+    question = QuestionFactory.build(question_choices=[{'value': 'b', 'label': 'B'}])
+
+    assert question.get_choice_labels() == {'b': 'B'}
+
+
 @pytest.mark.django_db
 def test_user_answer_object():
     user = UserFactory()
@@ -1,6 +1,8 @@
 import pytest
+from allauth.socialaccount.models import SocialAccount
 
 from sso.user import serializers
+from sso.user.models import User
 from sso.user.tests import factories
 
 
@@ -77,3 +79,30 @@ def test_user_serializer_has_profile():
     serializer = serializers.UserSerializer(user_profile.user)
 
     assert serializer.data['user_profile'] == serializers.UserProfileSerializer(user_profile).data
+
+
+@pytest.mark.django_db
+def test_user_serializer_loads_social_accounts_once(django_assert_num_queries):
+    user_profile = factories.UserProfileFactory.create()
+    SocialAccount.objects.create(user=user_profile.user, provider='google', uid='1', extra_data={'picture': 'a.png'})
+    user = User.objects.select_related('user_profile').get(pk=user_profile.user_id)
+
+    with django_assert_num_queries(1):
+        data = serializers.UserSerializer(user).data
+
+    assert data['social_login'] is True
+    assert data['user_profile']['social_account'] == 'google'
+    assert data['user_profile']['profile_image'] == 'a.png'
+
+
+@pytest.mark.django_db
+def test_user_serializer_many_loads_social_accounts_once(django_assert_num_queries):
+    user_profiles = factories.UserProfileFactory.create_batch(3)
+    SocialAccount.objects.create(user=user_profiles[0].user, provider='linkedin_oauth2', uid='1')
+    users = User.objects.select_related('user_profile').order_by('pk')
+
+    with django_assert_num_queries(2):
+        data = serializers.UserSerializer(users, many=True).data
+
+    assert [item['social_login'] for item in data] == [True, False, False]
+    assert [item['user_profile']['social_account'] for item in data] == ['linkedin_oauth2', 'email', 'email']
@@ -0,0 +1,68 @@
+from unittest import mock
+
+import pytest
+from django.apps import apps
+from django.db import DatabaseError, transaction
+
+from sso.user.models import OutboxEvent, OutboxMixin, User
+from sso.user.signals import OUTBOX_FIELDS
+from sso.user.tests.factories import UserAnswerFactory, UserFactory, UserProfileFactory
+
+
+@pytest.mark.django_db
+def test_outbox_records_saves():
+    user = UserFactory(email='jim@example.com')
+    profile = UserProfileFactory(user=user, mobile_phone_number='0123456789')
+    answer = UserAnswerFactory(user=user, answer=['a'])
+
+    events = list(OutboxEvent.objects.order_by('id'))
+    assert [(event.action, event.model, event.object_id) for event in events] == [
+        ('Update', 'User', user.pk),
+        ('Update', 'UserProfile', profile.pk),
+        ('Update', 'UserAnswer', answer.pk),
+    ]
+    assert all(event.user_id == user.pk for event in events)
+    assert events[0].data['email'] == 'jim@example.com'
+    assert 'password' not in events[0].data
+    assert events[1].data['mobile_phone_number'] == '0123456789'
+    assert events[2].data == {'question_id': answer.question_id, 'answer': ['a']}
+
+
+@pytest.mark.django_db
+def test_outbox_written_in_the_same_transaction():
+    with pytest.raises(ValueError):
+        with transaction.atomic():
+            UserFactory()
+            raise ValueError
+
+    assert User.objects.count() == 0
+    assert OutboxEvent.objects.count() == 0
+
+
+@pytest.mark.django_db(transaction=True)
+def test_outbox_save_rolled_back_with_its_event():
+    user = UserFactory(email='jim@example.com')
+    user.email = 'changed@example.com'
+
+    with mock.patch('sso.user.signals.create_outbox_event', side_effect=DatabaseError):
+        with pytest.raises(DatabaseError):
+            user.save()
+
+    user.refresh_from_db()
+    assert user.email == 'jim@example.com'
+
+
+def test_outbox_models_save_in_a_transaction():
+    assert all(issubclass(apps.get_model(label), OutboxMixin) for label in OUTBOX_FIELDS)
+
+
+@pytest.mark.django_db
+def test_outbox_records_deletes_and_redacts_the_user():
+    answer = UserAnswerFactory()
+    user_id = answer.user_id
+
+    answer.user.delete()
+
+    deletes = OutboxEvent.objects.filter(action=OutboxEvent.ACTION_DELETE)
+    assert {(event.model, event.object_id) for event in deletes} == {('User', user_id), ('UserAnswer', answer.pk)}
+    assert list(OutboxEvent.objects.filter(user_id=user_id).values_list('data', flat=True).distinct()) == [{}]
@@ -5,6 +5,7 @@ from allauth.socialaccount.models import SocialAccount
 from directory_constants import urls
 
 from sso.user import utils
+from sso.user.models import OutboxEvent, Service, ServicePage, UserPageView
 from sso.user.tests.factories import QuestionFactory, ServiceFactory, UserAnswerFactory, UserFactory
 
 
@@ -122,6 +123,24 @@ def test_get_questionnaire():
     assert len(questionnaire['answers']) == 1
 
 
+@pytest.mark.django_db
+def test_get_questionnaire_reads_answers_only(django_assert_num_queries):
+    user = UserFactory()
+    service = ServiceFactory()
+    QuestionFactory(service=service, id=0, name='in-progress', is_active=False)
+    questions = QuestionFactory.create_batch(3, service=service, predefined_choices='TURNOVER_CHOICES')
+    utils.set_questionnaire_answer(user, service.name, 0, 'in-progress')
+    for question in questions:
+        utils.set_questionnaire_answer(user, service.name, question.id, 'answer')
+    utils.get_questionnaire(user, service.name)
+
+    with django_assert_num_queries(1):
+        questionnaire = utils.get_questionnaire(user, service.name)
+
+    assert [question['id'] for question in questionnaire['questions']] == [question.id for question in questions]
+    assert questionnaire['answers'] == [{'question_id': question.id, 'answer': 'answer'} for question in questions]
+
+
 @pytest.mark.django_db
 def test_set_questionnaire_answer_invalid():
     user = UserFactory()
@@ -161,3 +180,94 @@ def test_notify_already_registered(mocked_notifications):
         },
         template_id='5c8cc5aa-a4f5-48ae-89e6-df5572c317ec',
     )
+
+
+@pytest.mark.django_db
+def test_set_page_views_records_new_views_only(django_capture_on_commit_callbacks):
+    with django_capture_on_commit_callbacks(execute=True):
+        user = UserFactory()
+        existing = utils.set_page_view(user, 'great', 'home')
+        ServicePage.objects.create(service=existing.service_page.service, page_name='about')
+
+    with django_capture_on_commit_callbacks() as callbacks:
+        page_views = utils.set_page_views(
+            user, [('great', 'home'), ('great', 'about'), ('cms', 'home'), ('great', 'about')]
+        )
+
+    assert [(view.service_page.service.name, view.service_page.page_name) for view in page_views] == [
+        ('great', 'home'),
+        ('great', 'about'),
+        ('cms', 'home'),
+    ]
+    assert page_views[0] == existing
+    assert UserPageView.objects.filter(user=user).count() == 3
+    assert ServicePage.objects.count() == 3
+    outbox = OutboxEvent.objects.filter(model='UserPageView', user_id=user.pk).exclude(object_id=existing.pk)
+    assert sorted(outbox.values_list('object_id', flat=True)) == sorted(view.pk for view in page_views[1:])
+    # the bulk inserts invalidate the cache like saves do
+    assert len(callbacks) == 1
+
+
+@pytest.mark.django_db
+def test_set_page_views_service_created_concurrently():
+    user = UserFactory()
+    bulk_create = Service.objects.bulk_create
+
+    def create_concurrently(services, **kwargs):
+        # another request inserts the service between the lookup and the insert
+        Service.objects.create(name='great')
+        return bulk_create(services, **kwargs)
+
+    with mock.patch.object(Service.objects, 'bulk_create', side_effect=create_concurrently):
+        page_views = utils.set_page_views(user, [('great', 'home'), ('cms', 'home')])
+
+    assert [view.service_page.service.name for view in page_views] == ['great', 'cms']
+    assert Service.objects.filter(name='great').count() == 1
+    assert utils.set_page_views(user, [('great', 'home')]) == page_views[:1]
+
+
+@pytest.mark.django_db
+def test_set_page_view_skips_catalogue_lookups(django_assert_num_queries):
+    utils.set_page_view(UserFactory(), 'great', 'home')
+    user = UserFactory()
+
+    # only the view's get_or_create and its outbox event
+    with django_assert_num_queries(5):
+        page_view = utils.set_page_view(user, 'great', 'home')
+
+    assert page_view.to_dict()['service'] == 'great'
+    assert page_view.to_dict()['page'] == 'home'
+
+
+@pytest.mark.django_db
+def test_get_page_view_reads_in_one_query(django_assert_num_queries):
+    user = UserFactory()
+    for page_name in ('home', 'about', 'contact'):
+        utils.set_page_view(user, 'great', page_name)
+    utils.set_page_view(user, 'cms', 'home')
+
+    with django_assert_num_queries(1):
+        page_views = utils.get_page_view(user, 'great')
+
+    assert sorted(view['page'] for view in page_views) == ['about', 'contact', 'home']
+    assert (
+        page_views[0]
+        == UserPageView.objects.get(
+            user=user, service_page__service__name='great', service_page__page_name=page_views[0]['page']
+        ).to_dict()
+    )
+    assert utils.get_page_view(user, 'great', 'about')[0]['page'] == 'about'
+    assert utils.get_page_view(user, 'missing') is None
+
+
+@pytest.mark.django_db
+def test_get_lesson_completed_reads_in_one_query(django_assert_num_queries):
+    user = UserFactory()
+    lessons = [utils.set_lesson_completed(user, 'great', 'lesson-page', lesson, 1) for lesson in (1, 2, 3)]
+    utils.set_lesson_completed(user, 'great', 'lesson-page', 4, 2)
+
+    with django_assert_num_queries(1):
+        lessons_completed = utils.get_lesson_completed(user, 'great', module=1)
+
+    assert sorted(lessons_completed, key=lambda lesson: lesson['lesson']) == [lesson.to_dict() for lesson in lessons]
+    assert utils.get_lesson_completed(user, 'missing') is None
@@ -15,6 +15,7 @@ from django.utils.http import urlsafe_base64_encode
 
 from core.tests.helpers import create_response
 from sso.user import models
+from sso.user.hashing import PasswordHashingUnavailable
 from sso.user.tests import factories
 from sso.verification.models import VerificationCode
 
@@ -153,6 +154,28 @@ def test_login_redirect_no_profile(client, verified_user, settings):
     assert response.url == 'http://profile.trade.great:8006/profile/enrol/?backfill-details-intent=true'
 
 
+@pytest.mark.django_db
+@patch.object(models.User, 'check_password', side_effect=PasswordHashingUnavailable)
+def test_login_no_hashing_slot(mock_check_password, client, verified_user):
+    response = client.post(reverse('account_login'), {'login': verified_user.email, 'password': 'password'})
+
+    assert response.status_code == 503
+    assert response['Retry-After'] == '1'
+
+
+@pytest.mark.django_db
+@patch.object(models.User, 'check_password', side_effect=PasswordHashingUnavailable)
+def test_password_change_no_hashing_slot(mock_check_password, authed_client):
+    response = authed_client.post(
+        reverse('account_change_password'),
+        {'oldpassword': 'password', 'password1': 'N3w-passw0rd!', 'password2': 'N3w-passw0rd!'},
+    )
+
+    assert response.status_code == 503
+    assert response['Retry-After'] == '1'
+    assert mock_check_password.call_count == 1
+
+
 @pytest.mark.django_db
 @patch('sso.adapters.NotificationsAPIClient')
 def test_login_redirect_no_profile_unverified(mock_notification, client, user, settings):
@@ -5,8 +5,10 @@ import pytest
 from django.urls import reverse
 from rest_framework.test import APIClient
 
+from sso.constants import API_DATETIME_FORMAT
 from sso.user import models
 from sso.user.tests import factories
+from sso.user.utils import set_page_view
 from sso.verification.models import VerificationCode
 
 
@@ -236,7 +238,8 @@ def test_update_user_profile_no_auth(api_client, user_profile_data):
     assert response.status_code == 401
 
 
-@pytest.mark.django_db
+# cached GET responses are invalidated on commit
+@pytest.mark.django_db(transaction=True)
 def test_set_page_view(api_client, page_view_data):
     def set_view(data):
         set_response = api_client.post(reverse('api:user-page-views'), data, format='json')
@@ -276,6 +279,59 @@ def test_set_page_view(api_client, page_view_data):
     assert page_views[page_view_data['page2']['page']] is not None
 
 
+@pytest.mark.django_db
+def test_get_page_view_not_cached_for_other_users(api_client):
+    user = factories.UserFactory()
+    set_page_view(user, 'great', 'home')
+    api_client.force_authenticate(user=user)
+    response = api_client.get(reverse('api:user-page-views'), {'service': 'great'})
+
+    api_client.force_authenticate(user=factories.UserFactory())
+    other_response = api_client.get(reverse('api:user-page-views'), {'service': 'great'})
+
+    assert 'private' in response['Cache-Control']
+    assert response.json()['page_views']['home']['page'] == 'home'
+    assert other_response.json().get('page_views') is None
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('size', (2, 50))
+def test_set_page_views(api_client, size, django_assert_num_queries):
+    profile = factories.UserProfileFactory()
+    api_client.force_authenticate(user=profile.user)
+    page_views = [{'service': 'great', 'page': f'page-{i}'} for i in range(size)]
+
+    # a lookup and an insert each for services, pages, views and outbox events, re-reading services, pages and views
+    with django_assert_num_queries(12):
+        response = api_client.post(reverse('api:user-page-views'), {'page_views': page_views}, format='json')
+
+    assert response.status_code == 200
+    assert [(view['service'], view['page']) for view in response.json()['page_views']] == [
+        ('great', f'page-{i}') for i in range(size)
+    ]
+    assert models.UserPageView.objects.filter(user=profile.user).count() == size
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('page_views', ([], [{'service': 'great'}], [{'service': 'great', 'page': 'x' * 129}]))
+def test_set_page_views_invalid(api_client, page_views):
+    api_client.force_authenticate(user=factories.UserFactory())
+
+    response = api_client.post(reverse('api:user-page-views'), {'page_views': page_views}, format='json')
+
+    assert response.status_code == 400
+
+
+@pytest.mark.django_db
+def test_set_page_views_too_many(api_client, settings):
+    api_client.force_authenticate(user=factories.UserFactory())
+    page_views = [{'service': 'great', 'page': f'page-{i}'} for i in range(settings.SSO_PAGE_VIEW_BATCH_MAX_SIZE + 1)]
+
+    response = api_client.post(reverse('api:user-page-views'), {'page_views': page_views}, format='json')
+
+    assert response.status_code == 400
+
+
 @pytest.fixture()
 def set_lesson_completed(api_client):
     profile = factories.UserProfileFactory()
@@ -355,6 +411,62 @@ def test_get_not_existing_lesson(api_client):
     assert response.json().get('lessson_completed') is None
 
 
+@pytest.mark.django_db
+def test_get_lesson_progress(api_client, django_assert_num_queries):
+    user = factories.UserFactory()
+    great, cms = factories.ServiceFactory(name='great'), factories.ServiceFactory(name='cms')
+    for module in (1, 1, 2):
+        factories.LessonCompletedFactory(user=user, service=great, module=module)
+    factories.LessonCompletedFactory(user=user, service=cms, module=1)
+    factories.LessonCompletedFactory(service=great, module=1)
+    api_client.force_authenticate(user=user)
+
+    # one GROUP BY, however many lessons were completed
+    with django_assert_num_queries(1):
+        response = api_client.get(reverse('api:user-lesson-progress'))
+
+    assert response.status_code == 200
+    assert response.json()['lesson_progress'] == {
+        'cms': {'lessons_completed': 1, 'modules': [{'module': 1, 'lessons_completed': 1}]},
+        'great': {
+            'lessons_completed': 3,
+            'modules': [{'module': 1, 'lessons_completed': 2}, {'module': 2, 'lessons_completed': 1}],
+        },
+    }
+
+
+@pytest.mark.django_db
+def test_get_lesson_progress_for_service_with_latest(api_client):
+    user = factories.UserFactory()
+    lessons = factories.LessonCompletedFactory.create_batch(
+        2, user=user, service=factories.ServiceFactory(name='great'), module=1
+    )
+    factories.LessonCompletedFactory(user=user, service=factories.ServiceFactory(name='cms'), module=1)
+    api_client.force_authenticate(user=user)
+
+    response = api_client.get(reverse('api:user-lesson-progress'), {'service': 'great', 'latest': 'true'})
+
+    assert response.status_code == 200
+    latest = lessons[-1].created.strftime(API_DATETIME_FORMAT)
+    assert response.json()['lesson_progress'] == {
+        'great': {
+            'lessons_completed': 2,
+            'latest': latest,
+            'modules': [{'module': 1, 'lessons_completed': 2, 'latest': latest}],
+        },
+    }
+
+
+@pytest.mark.django_db
+def test_get_lesson_progress_unknown_service(api_client):
+    api_client.force_authenticate(user=factories.UserFactory())
+
+    response = api_client.get(reverse('api:user-lesson-progress'), {'service': 'missing'})
+
+    assert response.status_code == 200
+    assert response.json()['lesson_progress'] == {}
+
+
 @pytest.mark.django_db
 def test_delete_endpoint_for_lesson_completed(api_client, set_lesson_completed):
 
@@ -486,7 +598,8 @@ def test_set_user_questionnaire_answer_invalid(api_client):
     assert response.status_code == 200
 
 
-@pytest.mark.django_db
+# cached GET responses are invalidated on commit
+@pytest.mark.django_db(transaction=True)
 def test_get_and_set_user_data(api_client):
     user = factories.UserFactory()
     api_client.force_authenticate(user=user)
@@ -7,11 +7,16 @@ from directory_api_client import api_client
 from directory_constants import urls
 from django.conf import settings
 from django.core.exceptions import ObjectDoesNotExist
+from django.db import transaction
+from django.db.models import Count, Max, Q
 from django.urls import reverse
 from django.utils.http import urlencode
 from notifications_python_client import NotificationsAPIClient
 
+from sso.constants import API_DATETIME_FORMAT
+from sso.user import catalogue
 from sso.user.models import LessonCompleted, Question, Service, ServicePage, UserAnswer, UserPageView
+from sso.user.signals import record_bulk_create
 
 
 def get_url_with_redirect(url, redirect_url):
@@ -84,26 +89,85 @@ def get_social_account_image(account):
 
 
 def set_page_view(user, service_name, page_name):
-    service, created = Service.objects.get_or_create(name=service_name)
-    service_page, created = ServicePage.objects.get_or_create(service=service, page_name=page_name)
+    service = catalogue.get_service(service_name, create=True)
+    service_page = catalogue.get_service_page(service, page_name, create=True)
     user_page_view, created = UserPageView.objects.get_or_create(service_page=service_page, user=user)
     return user_page_view
 
 
+def set_page_views(user, pages):
+    """Record that the user viewed each of the (service name, page name) pairs.
+
+    Services, pages and views are each looked up and inserted in bulk, in one
+    transaction, so a batch costs the same few queries whatever its size.
+    Returns the page views in the order of `pages`.
+    """
+    pages = list(dict.fromkeys(pages))
+    with transaction.atomic():
+        service_names = {service_name for service_name, _ in pages}
+        services = {service.name: service for service in Service.objects.filter(name__in=service_names)}
+        new_services = []
+        # the unique constraints settle a race with another request creating the same service, page or view
+        if len(services) < len(service_names):
+            Service.objects.bulk_create(
+                [Service(name=name) for name in service_names - services.keys()], ignore_conflicts=True
+            )
+            new_services = list(Service.objects.filter(name__in=service_names - services.keys()))
+            services.update((service.name, service) for service in new_services)
+
+        service_pages = get_service_pages(services, pages)
+        new_service_pages = []
+        if len(service_pages) < len(pages):
+            ServicePage.objects.bulk_create(
+                [ServicePage(service=services[service], page_name=page) for service, page in pages],
+                ignore_conflicts=True,
+            )
+            existing_page_ids = {service_page.pk for service_page in service_pages.values()}
+            service_pages = get_service_pages(services, pages)
+            new_service_pages = [page for page in service_pages.values() if page.pk not in existing_page_ids]
+
+        page_ids = [service_page.pk for service_page in service_pages.values()]
+        page_views = UserPageView.objects.filter(user=user, service_page_id__in=page_ids)
+        viewed_page_ids = set(page_views.values_list('service_page_id', flat=True))
+        if len(viewed_page_ids) < len(page_ids):
+            UserPageView.objects.bulk_create(
+                [UserPageView(user=user, service_page_id=page_id) for page_id in page_ids],
+                ignore_conflicts=True,
+            )
+        page_views = {view.service_page_id: view for view in page_views.select_related('service_page__service')}
+        new_page_views = [view for page_id, view in page_views.items() if page_id not in viewed_page_ids]
+        record_bulk_create([*new_services, *new_service_pages, *new_page_views])
+    return [page_views[service_pages[page].pk] for page in pages]
+
+
+def get_service_pages(services, pages):
+    """Map each (service name, page name) pair to its ServicePage, where one exists"""
+    service_names = {service.pk: name for name, service in services.items()}
+    service_pages = ServicePage.objects.filter(service_id__in=service_names, page_name__in={page for _, page in pages})
+    wanted = set(pages)
+    found = {}
+    for service_page in service_pages:
+        # the filter also matches pages of one service named like a page of another
+        key = (service_names[service_page.service_id], service_page.page_name)
+        if key in wanted:
+            found[key] = service_page
+    return found
+
+
 def get_page_view(user, service_name, page_name=None):
+    """The user's views of the service's pages, or of one page, shaped like UserPageView.to_dict() in one query"""
     try:
-        service = Service.objects.get(name=service_name)
-        if page_name:
-            return UserPageView.objects.filter(
-                user=user, service_page__service=service, service_page__page_name=page_name
-            )
-        return UserPageView.objects.filter(user=user, service_page__service=service)
+        service = catalogue.get_service(service_name)
     except ObjectDoesNotExist:
-        pass
+        return None
+    page_views = UserPageView.objects.filter(user=user, service_page__service=service)
+    if page_name:
+        page_views = page_views.filter(service_page__page_name=page_name)
+    return [UserPageView.values_to_dict(row) for row in page_views.values(*UserPageView.DICT_VALUES)]
 
 
 def set_lesson_completed(user, service_name, lesson_name, lesson, module):
-    service, created = Service.objects.get_or_create(name=service_name)
+    service = catalogue.get_service(service_name, create=True)
     lesson_completed, created = LessonCompleted.objects.get_or_create(
         user=user,
         service=service,
@@ -115,36 +179,77 @@ def set_lesson_completed(user, service_name, lesson_name, lesson, module):
 
 
 def get_lesson_completed(user, service, **filter_dict):
+    """The user's completed lessons of the service, shaped like LessonCompleted.to_dict() in one query"""
     try:
-        service = Service.objects.get(name=service)
-        return LessonCompleted.objects.filter(user=user, service=service, **filter_dict)
+        service = catalogue.get_service(service)
     except ObjectDoesNotExist:
         return None
+    lessons = LessonCompleted.objects.filter(user=user, service=service, **filter_dict)
+    return [LessonCompleted.values_to_dict(row) for row in lessons.values(*LessonCompleted.DICT_VALUES)]
+
+
+def get_lesson_progress(user, service_name=None, latest=False):
+    """Number of lessons the user completed per service and per module, counted with a single GROUP BY.
+
+    With `latest` each count comes with the time of the most recent completion.
+    """
+    lessons = LessonCompleted.objects.filter(user=user)
+    if service_name:
+        try:
+            lessons = lessons.filter(service=catalogue.get_service(service_name))
+        except ObjectDoesNotExist:
+            return {}
+    aggregates = {'lessons_completed': Count('id')}
+    if latest:
+        aggregates['latest'] = Max('created')
+    rows = lessons.values('service__name', 'module').annotate(**aggregates).order_by('service__name', 'module')
+
+    progress = {}
+    for row in rows:
+        module = {'module': row['module'], 'lessons_completed': row['lessons_completed']}
+        service = progress.setdefault(row['service__name'], {'lessons_completed': 0, 'modules': []})
+        service['lessons_completed'] += row['lessons_completed']
+        if latest:
+            module['latest'] = row['latest']
+            service['latest'] = max(service.get('latest', row['latest']), row['latest'])
+        service['modules'].append(module)
+    if latest:
+        for service in progress.values():
+            service['latest'] = service['latest'].strftime(API_DATETIME_FORMAT)
+            for module in service['modules']:
+                module['latest'] = module['latest'].strftime(API_DATETIME_FORMAT)
+    return progress
 
 
 def get_questionnaire(user, service_name):
+    """The service's questions and the user's answers to them, while the user has the questionnaire in progress.
+
+    The questions come from the catalogue, so only the user's answers are read.
+    """
     try:
-        service = Service.objects.get(name=service_name)
-        # check for the 'in-progress' answer
-        in_progress_answer = UserAnswer.objects.get(user=user, question=Question.objects.get(service=service, pk=0))
-        if in_progress_answer.answer == 'in-progress':
-            questions = Question.objects.filter(service=service, is_active=True)
-            return {
-                'questions': [question.to_dict() for question in questions],
-                'answers': [
-                    answer.to_dict()
-                    for answer in UserAnswer.objects.filter(
-                        user=user, question__service=service, question__is_active=True
-                    )
-                ],
-            }
+        service = catalogue.get_service(service_name)
     except ObjectDoesNotExist:
-        pass
+        return None
+    # the 'in-progress' answer is kept against question 0, whether or not that question is active
+    answers = UserAnswer.objects.filter(user=user, question__service=service).filter(
+        Q(question_id=0) | Q(question__is_active=True)
+    )
+    answers = answers.values('question_id', 'answer', 'question__is_active')
+    if not any(answer['question_id'] == 0 and answer['answer'] == 'in-progress' for answer in answers):
+        return None
+    return {
+        'questions': catalogue.get_questions(service),
+        'answers': [
+            {'question_id': answer['question_id'], 'answer': answer['answer']}
+            for answer in answers
+            if answer['question__is_active']
+        ],
+    }
 
 
 def set_questionnaire_answer(user, service, question_id, user_answer):
     try:
-        service = Service.objects.get(name=service)
+        service = catalogue.get_service(service)
         question = Question.objects.get(service=service, id=question_id)
         answer = UserAnswer.objects.filter(user=user, question=question)
 
@@ -1,3 +1,4 @@
+import sentry_sdk
 from django.core.exceptions import ObjectDoesNotExist
 from django.db import IntegrityError
 from django.http import JsonResponse
@@ -9,18 +10,19 @@ from rest_framework.generics import CreateAPIView, GenericAPIView, UpdateAPIView
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
-import sentry_sdk
 
 from conf.signature import SignatureCheckPermission
 from core.authentication import SessionAuthentication
-from sso.user import serializers
-from sso.user.models import LessonCompleted, Service, User, UserData, UserProfile
+from sso.user import catalogue, serializers
+from sso.user.models import LessonCompleted, User, UserData, UserProfile
 from sso.user.utils import (
     get_lesson_completed,
+    get_lesson_progress,
     get_page_view,
     get_questionnaire,
     set_lesson_completed,
     set_page_view,
+    set_page_views,
     set_questionnaire_answer,
 )
 
@@ -73,21 +75,27 @@ class UserPageViewAPIView(GenericAPIView):
     authentication_classes = [SessionAuthentication]
 
     def post(self, request, query=None, *args, **kwargs):
+        if 'page_views' in request.data:
+            return self.post_many(request)
         service = request.data.get('service')
         page = request.data.get('page')
         page_view = set_page_view(self.request.user, service, page)
         return Response(status=200, data={'result': 'ok', 'page_view': page_view.to_dict()})
 
+    def post_many(self, request):
+        serializer = serializers.PageViewsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        pages = [(page_view['service'], page_view['page']) for page_view in serializer.validated_data['page_views']]
+        page_views = set_page_views(self.request.user, pages)
+        return Response(status=200, data={'result': 'ok', 'page_views': [view.to_dict() for view in page_views]})
+
     def get(self, request):
         service = request.query_params.get('service')
         page = request.query_params.get('page')
         page_views = get_page_view(self.request.user, service, page)
         data = {'result': 'ok'}
-        if page_views and page_views.count():
-            page_views_dict = {}
-            for page_view in page_views:
-                page_views_dict[page_view.service_page.page_name] = page_view.to_dict()
-            data['page_views'] = page_views_dict
+        if page_views:
+            data['page_views'] = {page_view['page']: page_view for page_view in page_views}
         return Response(status=200, data=data)
 
 
@@ -112,15 +120,12 @@ class LessonCompletedAPIView(GenericAPIView):
 
         lesson_completed = get_lesson_completed(self.request.user, service, **filter_dict)
         data = {'result': 'ok'}
-        if lesson_completed and lesson_completed.count():
-            lesson_completed_lst = []
-            for lesson in lesson_completed:
-                lesson_completed_lst.append(lesson.to_dict())
-            data['lesson_completed'] = lesson_completed_lst
+        if lesson_completed:
+            data['lesson_completed'] = lesson_completed
         return Response(status=200, data=data)
 
     def delete(self, request, format=None):
-        service = Service.objects.get(name=request.data.get('service'))
+        service = catalogue.get_service(request.data.get('service'))
         lesson_id = request.data.get('lesson')
         try:
             lesson = LessonCompleted.objects.get(service=service, lesson=lesson_id, user=request.user)
@@ -133,6 +138,17 @@ class LessonCompletedAPIView(GenericAPIView):
         return Response(response)
 
 
+class LessonProgressAPIView(GenericAPIView):
+    permission_classes = [IsAuthenticated, SignatureCheckPermission]
+    authentication_classes = [SessionAuthentication]
+
+    def get(self, request):
+        service = request.query_params.get('service')
+        latest = request.query_params.get('latest') == 'true'
+        progress = get_lesson_progress(self.request.user, service, latest=latest)
+        return Response(status=200, data={'result': 'ok', 'lesson_progress': progress})
+
+
 class UserQuestionnaireView(GenericAPIView):
     permission_classes = [IsAuthenticated, SignatureCheckPermission]
     authentication_classes = [SessionAuthentication]